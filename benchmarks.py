@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import sys
+import timeit
+import numpy as np
+
+
+def timed(f, *args, **kwargs):
+    '''returns (result, seconds) for a single call of f'''
+    start = timeit.default_timer()
+    result = f(*args, **kwargs)
+    return result, timeit.default_timer() - start
+
+
+def best_of(repeat, f, *args, **kwargs):
+    '''returns (result, fastest seconds) over repeat calls of f'''
+    seconds = []
+    for _ in range(repeat):
+        result, elapsed = timed(f, *args, **kwargs)
+        seconds.append(elapsed)
+    return result, min(seconds)
+
+
+def bench_rescale(row_counts=(10**4, 10**6, 10**7), num_cols=2,
+                  max_cellwise_cells=2 * 10**6):
+    '''times rescale / de_mean_matrix against their cell by cell versions
+    the cell by cell path is only run up to max_cellwise_cells entries,
+    beyond that its time is extrapolated from the per cell cost'''
+    import rescaling
+
+    np.random.seed(0)
+    per_cell = {}
+
+    for num_rows in row_counts:
+        X = np.matrix(np.random.normal(20, 10, (num_rows, num_cols)))
+        num_cells = num_rows * num_cols
+
+        for name, fast, slow in [
+                ('rescale', rescaling.rescale, rescaling.rescale_cellwise),
+                ('de_mean_matrix', rescaling.de_mean_matrix,
+                 rescaling.de_mean_matrix_cellwise)]:
+            fast_result, fast_time = timed(fast, X)
+
+            if num_cells <= max_cellwise_cells:
+                slow_result, slow_time = timed(slow, X)
+                assert np.allclose(fast_result, slow_result)
+                per_cell[name] = slow_time / num_cells
+                note = ''
+            elif name in per_cell:
+                slow_time = per_cell[name] * num_cells
+                note = ' (est.)'
+            else:
+                slow_time, note = float('nan'), ' (skipped)'
+
+            print('%-15s rows: %9d  vectorized: %9.4fs  cellwise: %9.2fs%s'
+                  '  speedup: %.0fx' % (name, num_rows, fast_time, slow_time,
+                                         note, slow_time / fast_time))
+
+
+def deep_size(rows):
+    '''rough bytes held by a list of dicts (the dicts and their values)'''
+    return sys.getsizeof(rows) + sum(sys.getsizeof(row) +
+                                     sum(sys.getsizeof(value)
+                                         for value in row.values())
+                                     for row in rows)
+
+
+def bench_load_columns(filename='stocks.csv', delimiter='\t', repeat=5):
+    '''times parse_dict over a DictReader against load_columns'''
+    import csv
+    import dateutil.parser
+    import cleandata
+
+    parser_dict = {'date': dateutil.parser.parse,
+                   'closing_price': float}
+
+    def load_dicts():
+        with open(filename) as f:
+            reader = csv.DictReader(f, delimiter=delimiter)
+            return [cleandata.parse_dict(row, parser_dict) for row in reader]
+
+    def load_columns():
+        with open(filename) as f:
+            return cleandata.load_columns(f, parser_dict, delimiter)
+
+    rows, dict_time = best_of(repeat, load_dicts)
+    columns, column_time = best_of(repeat, load_columns)
+    column_bytes = sum(column.nbytes for column in columns.data.values())
+
+    print('rows: %d' % len(rows))
+    print('parse_dict:   %8.4fs  %10d bytes' % (dict_time, deep_size(rows)))
+    print('load_columns: %8.4fs  %10d bytes' % (column_time, column_bytes))
+    print('speedup: %.0fx' % (dict_time / column_time))
+
+
+def bench_date_parser(filename='stocks.csv', delimiter='\t', repeat=3):
+    '''times dateutil.parser.parse against DateParser on every date cell'''
+    import csv
+    import dateutil.parser
+    import cleandata
+
+    with open(filename) as f:
+        dates = [row['date'] for row in csv.DictReader(f, delimiter=delimiter)]
+
+    def parse_all(parse):
+        return [parse(date) for date in dates]
+
+    expected, dateutil_time = best_of(repeat, parse_all, dateutil.parser.parse)
+    no_cache = cleandata.DateParser.from_sample(dates[:100], cache_size=0)
+    parsed, fixed_time = best_of(repeat, parse_all, no_cache)
+    assert parsed == expected
+    # a fresh parser each time, so the cache starts out cold
+    parsed, cached_time = best_of(repeat,
+                                  lambda: parse_all(cleandata.DateParser()))
+    assert parsed == expected
+
+    print('dates: %d (%d distinct)' % (len(dates), len(set(dates))))
+    print('dateutil:         %8.4fs' % dateutil_time)
+    print('fixed format:     %8.4fs  speedup: %.0fx' % (fixed_time,
+                                                      dateutil_time / fixed_time))
+    print('fixed + memoized: %8.4fs  speedup: %.0fx' % (cached_time,
+                                                      dateutil_time / cached_time))
+
+
+def least_squares_problem(num_rows=100000, num_features=10, seed=0):
+    '''x, y for a linear model plus noise, with the summed squared error
+    and its gradient as (x_batch, y_batch, theta) functions'''
+    random_state = np.random.RandomState(seed)
+    x = np.c_[np.ones(num_rows), random_state.normal(size=(num_rows, num_features - 1))]
+    y = x.dot(random_state.normal(size=num_features)) + random_state.normal(0, 0.1, num_rows)
+
+    def squared_error(x_batch, y_batch, theta):
+        errors = np.dot(x_batch, theta) - y_batch
+        return np.dot(errors, errors)
+
+    def squared_error_gradient(x_batch, y_batch, theta):
+        return 2 * np.dot(x_batch.T, np.dot(x_batch, theta) - y_batch)
+
+    return x, y, squared_error, squared_error_gradient
+
+
+def bench_minibatch(batch_sizes=(1, 32, 256, 4096), epochs=3):
+    '''samples per second of minimize_minibatch by batch size'''
+    import gradient
+
+    x, y, target_fn, gradient_fn = least_squares_problem()
+    for batch_size in batch_sizes:
+        # batch size 1 is one python step per point, like minimize_stochastic
+        num_rows = 10000 if batch_size == 1 else len(x)
+        result = gradient.minimize_minibatch(target_fn, gradient_fn,
+                                             x[:num_rows], y[:num_rows],
+                                             np.zeros(x.shape[1]),
+                                             batch_size=batch_size,
+                                             max_epochs=epochs, seed=0)
+        print('batch size: %5d  samples/s: %12.0f  value: %g'
+              % (batch_size, result.samples_per_second,
+                 result.value / num_rows))
+
+
+def quadratic_problem(dimension=20, condition=100.0, seed=0):
+    '''f(theta) = theta.A.theta / 2 - b.theta with A's eigenvalues
+    spread from 1 to condition, and its minimizer A^-1 b'''
+    random_state = np.random.RandomState(seed)
+    q, _ = np.linalg.qr(random_state.normal(size=(dimension, dimension)))
+    A = np.dot(q * np.linspace(1, condition, dimension), q.T)
+    b = random_state.normal(size=dimension)
+    
+    target_fn = lambda theta: 0.5 * np.dot(theta, np.dot(A, theta)) - np.dot(b, theta)
+    gradient_fn = lambda theta: np.dot(A, theta) - b
+    return target_fn, gradient_fn, np.zeros(dimension), np.linalg.solve(A, b)
+
+
+def logistic_problem(num_rows=5000, dimension=10, seed=0):
+    '''mean logistic loss of a linear model on separable-ish data, and
+    its minimizer (found with newton's method)'''
+    random_state = np.random.RandomState(seed)
+    x = np.c_[np.ones(num_rows), random_state.normal(size=(num_rows, dimension - 1))]
+    p = 1 / (1 + np.exp(-np.dot(x, random_state.normal(size=dimension))))
+    y = (random_state.uniform(size=num_rows) < p).astype(float)
+    
+    def target_fn(theta):
+        z = np.dot(x, theta)
+        return np.mean(np.logaddexp(0, z) - y * z)
+    
+    def gradient_fn(theta):
+        return np.dot(x.T, 1 / (1 + np.exp(-np.dot(x, theta))) - y) / num_rows
+    
+    theta_star = np.zeros(dimension)
+    for _ in range(25):
+        p = 1 / (1 + np.exp(-np.dot(x, theta_star)))
+        hessian = np.dot(x.T * (p * (1 - p)), x) / num_rows
+        theta_star = theta_star - np.linalg.solve(hessian, gradient_fn(theta_star))
+    
+    return target_fn, gradient_fn, np.zeros(dimension), theta_star
+
+
+def bench_line_search(repeat=3):
+    '''objective evaluations, wall time and distance from the known
+    minimum of minimize_batch_with_stats for each line search'''
+    import gradient
+    
+    searches = [('fixed grid', gradient.FixedGridSearch),
+                ('armijo', gradient.BacktrackingArmijo),
+                ('cached armijo', gradient.CachedStepArmijo)]
+    
+    for problem_name, problem in [('quadratic', quadratic_problem),
+                                  ('logistic', logistic_problem)]:
+        target_fn, gradient_fn, theta_0, theta_star = problem()
+        for search_name, line_search in searches:
+            result, seconds = best_of(repeat, lambda: gradient.minimize_batch_with_stats(
+                target_fn, gradient_fn, theta_0, line_search=line_search()))
+            print('%-10s %-14s iterations: %6d  evaluations: %7d  '
+                  'seconds: %8.4f  value - min: %.2e  |theta - argmin|: %.2e'
+                  % (problem_name, search_name, result.iterations,
+                     result.evaluations, seconds,
+                     result.value - target_fn(theta_star),
+                     np.linalg.norm(result.theta - theta_star)))
+
+
+def bench_fastnorm(num_calls=20000, array_size=10**6, repeat=3):
+    '''microseconds per scalar call, and nanoseconds per element of an
+    array, of scipy's norm against fastnorm'''
+    from scipy.stats import norm
+    import fastnorm
+    
+    random_state = np.random.RandomState(0)
+    xs = random_state.normal(size=array_size)
+    ps = random_state.uniform(size=array_size)
+    fastnorm.tables()  # don't time building them
+    
+    def scalar_calls(f, points):
+        for point in points:
+            f(point)
+    
+    for name, points in [('cdf', xs), ('ppf', ps), ('pdf', xs)]:
+        exact, fast = getattr(norm, name), getattr(fastnorm, name)
+        scalars = points[:num_calls].tolist()
+        _, exact_scalar = best_of(repeat, scalar_calls, exact, scalars)
+        _, fast_scalar = best_of(repeat, scalar_calls, fast, scalars)
+        exact_result, exact_array = best_of(repeat, exact, points)
+        fast_result, fast_array = best_of(repeat, fast, points)
+        
+        print('%s  per call: scipy %6.2fus  fastnorm %6.2fus (%4.1fx)  '
+              'per element: scipy %6.2fns  fastnorm %6.2fns (%4.1fx)  '
+              'max error: %.1e'
+              % (name, 1e6 * exact_scalar / num_calls, 1e6 * fast_scalar / num_calls,
+                 exact_scalar / fast_scalar,
+                 1e9 * exact_array / array_size, 1e9 * fast_array / array_size,
+                 exact_array / fast_array,
+                 np.abs(exact_result - fast_result).max()))
+
+
+benchmarks = {
+    'rescale': bench_rescale,
+    'load_columns': bench_load_columns,
+    'date_parser': bench_date_parser,
+    'minibatch': bench_minibatch,
+    'line_search': bench_line_search,
+    'fastnorm': bench_fastnorm,
+}
+
+
+if __name__ == '__main__':
+    # run the benchmarks named on the command line, or all of them
+    for name in sys.argv[1:] or sorted(benchmarks):
+        print('-' * 40)
+        print(name)
+        benchmarks[name]()
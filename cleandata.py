@@ -3,7 +3,10 @@
 from __future__ import division
 
 import csv
+import datetime
 import dateutil.parser
+import numpy as np
+from collections import OrderedDict
 
 
 def parse_row(input_row, parsers):
@@ -43,20 +46,263 @@ def parse_dict(input_dict, parser_dict):
             for field_name, value in input_dict.iteritems()}
 
 
+# fast date parsing - most date columns use one fixed format, and the same
+# dates repeat (e.g. once per stock symbol), so dateutil's format guessing
+# is only needed for the odd row
+
+def parse_iso_date(s):
+    '''parses YYYY-MM-DD'''
+    if len(s) != 10 or s[4] != '-' or s[7] != '-':
+        raise ValueError('not an iso date: %r' % s)
+    return datetime.datetime(int(s[:4]), int(s[5:7]), int(s[8:]))
+
+
+def parse_us_date(s):
+    '''parses m/d/YYYY'''
+    month, day, year = s.split('/')
+    if len(year) != 4:
+        raise ValueError('not a m/d/YYYY date: %r' % s)
+    return datetime.datetime(int(year), int(month), int(day))
+
+
+def strptime_parser(date_format):
+    return lambda s: datetime.datetime.strptime(s, date_format)
+
+
+# formats tried in order when inferring, with their fast parsers
+date_formats = OrderedDict([
+    ('%Y-%m-%d', parse_iso_date),
+    ('%m/%d/%Y', parse_us_date),
+    ('%Y-%m-%d %H:%M:%S', strptime_parser('%Y-%m-%d %H:%M:%S')),
+    ('%Y-%m-%dT%H:%M:%S', strptime_parser('%Y-%m-%dT%H:%M:%S')),
+])
+
+
+def infer_date_format(sample):
+    '''returns the first of date_formats that parses every value
+    in the sample, or None if none of them do'''
+    sample = [value.strip() for value in sample if value.strip()]
+    for date_format, parse in date_formats.items():
+        try:
+            for value in sample:
+                parse(value)
+        except ValueError:
+            continue
+        if sample:
+            return date_format
+    return None
+
+
+class DateParser(object):
+    '''drop in replacement for dateutil.parser.parse in a parser_dict or
+    parser list
+    parses with a fixed format (given, or inferred from the first value
+    it sees), remembers up to cache_size recently parsed strings and falls
+    back to dateutil for values that don't match the format'''
+    
+    def __init__(self, date_format=None, cache_size=65536):
+        self.date_format = date_format
+        self.given_format = date_format  # date_format changes when inferred
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        
+        if date_format is None:
+            self.parse_fixed = None
+        else:
+            self.parse_fixed = (date_formats.get(date_format) or
+                                strptime_parser(date_format))
+    
+    @classmethod
+    def from_sample(cls, sample, cache_size=65536):
+        return cls(infer_date_format(sample), cache_size)
+    
+    def __repr__(self):
+        '''how it was made - the same before and after it infers a format'''
+        return 'DateParser(%r)' % self.given_format
+    
+    def __call__(self, s):
+        cache = self.cache
+        if s in cache:
+            # move it to the most recently used end
+            value = cache[s] = cache.pop(s)
+            return value
+        
+        value = self.parse(s)
+        cache[s] = value
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)  # the least recently used
+        return value
+    
+    def parse(self, s):
+        if self.parse_fixed is None:
+            date_format = infer_date_format([s])
+            if date_format is not None:
+                self.date_format = date_format
+                self.parse_fixed = date_formats[date_format]
+        
+        if self.parse_fixed is not None:
+            try:
+                return self.parse_fixed(s)
+            except ValueError:
+                pass
+        return dateutil.parser.parse(s)
+
+
+# columnar loading - parse whole columns into typed arrays at once
+# instead of calling a parser per cell and building a dict per row
+
+class Columns(object):
+    '''typed columns of a csv file
+    data[name] is a float64, datetime64 or (for unparsed fields)
+    int32 category code array, errors[name] is True where a cell didn't parse
+    and categories[name] holds the labels the codes index into'''
+    
+    def __init__(self, names, data, errors, categories):
+        self.names = names
+        self.data = data
+        self.errors = errors
+        self.categories = categories
+    
+    def __len__(self):
+        return len(self.data[self.names[0]]) if self.names else 0
+    
+    def __getitem__(self, name):
+        return self.data[name]
+    
+    def labels(self, name):
+        '''decode a categorical column back to its values'''
+        return self.categories[name][self.data[name]]
+    
+    def row(self, i):
+        '''the ith row as a dict of python values, like parse_dict returns'''
+        return {name: (self.categories[name][self.data[name][i]]
+                       if name in self.categories
+                       else self.data[name][i]).item()
+                for name in self.names}
+
+
+def no_errors(values):
+    return np.zeros(len(values), dtype=bool)
+
+
+def to_typed_array(parsed, errors):
+    '''packs parsed python values into a float64 / datetime64 array
+    (bad cells become nan / NaT), or an object array for anything else'''
+    good = [value for value, error in zip(parsed, errors) if not error]
+    
+    if good and all(isinstance(value, datetime.datetime) for value in good):
+        return np.array([None if error else value
+                         for value, error in zip(parsed, errors)],
+                        dtype='datetime64[us]')
+    try:
+        return np.array([np.nan if error else value
+                         for value, error in zip(parsed, errors)],
+                        dtype=float)
+    except (TypeError, ValueError):
+        return np.array(parsed, dtype=object)
+
+
+def parse_unique_values(values, parser):
+    '''applies parser once per distinct value, rather than once per cell,
+    and broadcasts the results back over the column'''
+    uniques, inverse = np.unique(np.asarray(values), return_inverse=True)
+    parse = try_or_none(parser)
+    parsed = [parse(value) for value in uniques]
+    errors = np.array([value is None for value in parsed], dtype=bool)
+    return to_typed_array(parsed, errors)[inverse], errors[inverse]
+
+
+def parse_float_column(values):
+    try:
+        # numpy converts the whole list of strings in one call
+        return np.array(values, dtype=float), no_errors(values)
+    except ValueError:
+        # at least one bad cell, so find them
+        return parse_unique_values(values, float)
+
+
+def is_iso_date_column(values):
+    '''True if every value is laid out like YYYY-MM-DD. numpy's bulk
+    conversion is only trusted with those, since it also takes '' and
+    'NaT' (as NaT) and '2015' (as 2015-01-01, where dateutil gives today's
+    month and day)'''
+    strings = np.asarray(values)
+    if len(strings) == 0:
+        return True
+    kind = strings.dtype.kind
+    if kind not in 'SU' or (np.char.str_len(strings) != 10).any():
+        return False
+    chars = strings.view(kind + '1').reshape(len(strings), -1)
+    dash = b'-' if kind == 'S' else u'-'
+    return bool((chars[:, [4, 7]] == dash).all())
+
+
+def parse_date_column(values, parser=dateutil.parser.parse):
+    if is_iso_date_column(values):
+        try:
+            # iso 8601 dates convert in bulk
+            dates = np.array(values, dtype='datetime64[us]')
+            return dates, np.isnat(dates)
+        except ValueError:
+            pass  # e.g. 2015-13-01
+    return parse_unique_values(values, parser)
+
+
+def categorize_column(values):
+    '''returns (codes, labels) where labels[codes] == values'''
+    labels, codes = np.unique(np.asarray(values), return_inverse=True)
+    return codes.astype(np.int32), labels
+
+
+def parse_column(values, parser):
+    '''returns (typed values, error mask) for a column of strings'''
+    if parser is float:
+        return parse_float_column(values)
+    if parser is dateutil.parser.parse:
+        return parse_date_column(values)
+    if isinstance(parser, DateParser):
+        # the bulk iso conversion only agrees with the parser if that's
+        # its format (or it has none yet, and will infer iso from them)
+        if parser.date_format in (None, '%Y-%m-%d'):
+            return parse_date_column(values, parser)
+        return parse_unique_values(values, parser)
+    return parse_unique_values(values, parser)
+
+
+def load_columns(f, parser_dict, delimiter=','):
+    '''reads the csv file f (with a header row) into Columns
+    fields in parser_dict are parsed with their parser, the rest are
+    stored as category codes'''
+    reader = csv.reader(f, delimiter=delimiter)
+    names = next(reader)
+    columns = list(zip(*reader)) or [()] * len(names)
+    
+    data, errors, categories = {}, {}, {}
+    for name, values in zip(names, columns):
+        parser = parser_dict.get(name)
+        if parser is None:
+            data[name], categories[name] = categorize_column(values)
+            errors[name] = no_errors(values)
+        else:
+            data[name], errors[name] = parse_column(values, parser)
+    
+    return Columns(names, data, errors, categories)
+
+
 if __name__ == '__main__':
     data = []
     
     with open('stock_prices.csv', 'rb') as f:
         reader = csv.reader(f)
-        for line in parse_rows_with(reader, [dateutil.parser.parse, None, float]):
+        for line in parse_rows_with(reader, [DateParser(), None, float]):
             data.append(line)
 
     for row in data:
         if any(x is None for x in row):
-            print row
+            print(row)
     
     # try it with a dict reader
-    parser_dict = {'date': dateutil.parser.parse,
+    parser_dict = {'date': DateParser(),
                    'price': float}
     
     with open('stock_prices.csv', 'rb') as f:
@@ -64,4 +310,12 @@ if __name__ == '__main__':
         data = [parse_dict(row, parser_dict) for row in reader]
 
     for row in data:
-        print row
\ No newline at end of file
+        print(row)
+
+    # or load it into typed columns
+    with open('stock_prices.csv', 'rb') as f:
+        columns = load_columns(f, parser_dict)
+
+    print(columns['date'])
+    print(columns['price'])
+    print(columns.labels('stock'))
\ No newline at end of file
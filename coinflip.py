@@ -3,29 +3,16 @@
 from __future__ import division
 import math
 import numpy as np
+from collections import namedtuple
+from sampling import Sampler
 from matplotlib import pyplot as plt
-from scipy.stats import norm
+from scipy.stats import norm as scipy_norm
+import fastnorm
 from pprint import pprint
 
 
-xs = np.array([x / 10.0 for x in range(-50, 50)])
-pprint(xs)
-mean = xs.mean()
-std = xs.std()
-print('mean: %f' % mean)
-print('std: %f' % std)
-
-pt = mean# + std
-cdf = norm.cdf(pt, loc=mean)   # gets the probability (percent) that a random var <= pt
-ppf = norm.ppf(cdf, loc=mean)  # gets the pt where the probability is the cdf
-
-print('pt: %f' % pt)
-print('cdf: %f as (percentage / 100)' % cdf)
-print('ppf: %f as pt' % ppf)
-
-print('')
-print('-' * 40)
-print('')
+# scipy's norm unless use_fastnorm swaps in the table lookups
+norm = scipy_norm
 
 
 def norm_approx_to_binomial(n, p):
@@ -35,6 +22,9 @@ def norm_approx_to_binomial(n, p):
     return mu, sigma
 
 
+# like norm.cdf and norm.ppf these all take arrays as well as numbers,
+# and broadcast lo / hi / prob against mu and sigma, so one call can
+# cover a whole table of (metric, segment) tests
 norm_prob_below = norm.cdf
 
 def norm_prob_above(lo, mu=0, sigma=1):
@@ -68,19 +58,203 @@ def norm_two_sided_bounds(prob, mu=0, sigma=1):
     return lower_bound, upper_bound
 
 
-mu_0, sigma_0 = norm_approx_to_binomial(1000, 0.5)
-print('samples: %d' % 1000)
-print('prob: %f' % 0.5)
-print('mu: %f, sigma: %f' % (mu_0, sigma_0))
+def use_fastnorm(fast=True):
+    '''make the functions here use fastnorm's interpolated tables (good to
+    ~3e-9, see fastnorm) instead of scipy's exact norm, or go back'''
+    global norm, norm_prob_below
+    norm = fastnorm if fast else scipy_norm
+    norm_prob_below = norm.cdf
+
+
+def two_sided_p_value(x, mu=0, sigma=1, correction=None):
+    '''probability of something at least as far from mu as x
+    x, mu and sigma can be arrays, which broadcast against each other,
+    and correction (a name from p_value_corrections) adjusts the whole
+    array of p values for the number of them tested'''
+    x, mu = np.asarray(x), np.asarray(mu)
+    # the tail is what's greater than x if x is above the mean, or what's
+    # less than x if it's below. both are the same as the upper tail
+    # beyond mu + |x - mu|, which norm.sf gets without 1 - cdf rounding to 0
+    p_values = 2 * norm.sf(mu + np.abs(x - mu), mu, sigma)
+    if correction is not None:
+        p_values = p_value_corrections[correction](p_values)
+    return p_values
+
+
+def bonferroni(p_values):
+    '''each p value times the number of them (at most 1), which bounds
+    the chance of any false positive among them'''
+    p_values = np.asarray(p_values, dtype=float)
+    return np.minimum(p_values * p_values.size, 1.0)
+
+
+def benjamini_hochberg(p_values):
+    '''benjamini-hochberg adjusted p values (q values), which bound the
+    expected fraction of false positives among those that are rejected
+    the kth smallest of n p values becomes the smallest p * n / rank of it
+    and the ones above it - one sort, then a running minimum'''
+    p_values = np.asarray(p_values, dtype=float)
+    flat = p_values.ravel()
+    n = flat.size
+    order = np.argsort(flat)
+    scaled = flat[order] * n / np.arange(1, n + 1)
+    adjusted = np.minimum.accumulate(scaled[::-1])[::-1]
+    
+    result = np.empty(n)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result.reshape(p_values.shape)
+
+
+p_value_corrections = {
+    'bonferroni': bonferroni,
+    'benjamini-hochberg': benjamini_hochberg,
+}
+
+# monte carlo check of the normal approximation: flip n coins with
+# P(heads) = p in num_trials simulated experiments, and count how often
+# the test (reject when the number of heads is outside the region that
+# norm_two_sided_bounds gives for p_0) rejects. with p = p_0 that is the
+# false positive rate, otherwise it's the power
+#
+# the trials are drawn block_size at a time, block i from stream i of
+# seed, and the blocks are counted in order, so the estimates (and when
+# they stop) are the same however many workers draw them
+
+# running estimate of the rejection rate with its confidence interval
+RateEstimate = namedtuple('RateEstimate',
+                          ['trials', 'rejections', 'rate', 'lower', 'upper'])
+
+
+def rejection_region(n, p_0=0.5, significance=0.05):
+    '''returns the (lo, hi) numbers of heads out of n, outside of which
+    the hypothesis P(heads) = p_0 is rejected'''
+    mu_0, sigma_0 = norm_approx_to_binomial(n, p_0)
+    return norm_two_sided_bounds(1 - significance, mu_0, sigma_0)
+
+
+def predicted_rejection_rate(n, p, lo, hi):
+    '''what the normal approximation says the rejection rate should be'''
+    return norm_prob_outside(lo, hi, *norm_approx_to_binomial(n, p))
+
+
+def count_rejections(heads, lo, hi):
+    return int(np.count_nonzero((heads < lo) | (heads > hi)))
+
 
-# decide what is significant -> 5% chance of a false positive
-lo, hi = norm_two_sided_bounds(.95, mu_0, sigma_0)
-print('.95 around mean: %f, %f' % (lo, hi))
+def rate_interval(rejections, trials, confidence=0.95):
+    '''wilson score interval for the rejection rate, which (unlike
+    rate +- z * standard error) isn't zero width when the rate is 0 or 1'''
+    z = norm_lower_bound((1 - confidence) / 2)
+    rate = rejections / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / trials +
+                               z * z / (4 * trials * trials)) / denominator
+    return center - half_width, center + half_width
 
-def two_sided_p_value(x, mu=0, sigma=1):
-    if x >= mu:
-        # if x is greater than the mean, the tail is what's greater than x
-        return 2 * normal_probability_above(x, mu, sigma)
+
+def _simulate_block(job):
+    seed, block_index, n, p, lo, hi, block_size = job
+    heads = Sampler(seed, block_index).binomial(n, p, block_size)
+    return block_size, count_rejections(heads, lo, hi)
+
+
+def simulate_rejections(n, p, lo, hi, precision=0.001, confidence=0.95,
+                        max_trials=10**7, block_size=100000, seed=0,
+                        num_workers=1):
+    '''generator of a RateEstimate after each block of trials, that stops
+    once the confidence interval is no wider than 2 * precision
+    (or after max_trials)'''
+    num_blocks = int(math.ceil(max_trials / block_size))
+    jobs = ((seed, i, n, p, lo, hi, min(block_size, max_trials - i * block_size))
+            for i in range(num_blocks))
+    
+    if num_workers > 1:
+        from multiprocessing import Pool
+        pool = Pool(num_workers)
+        blocks = pool.imap(_simulate_block, jobs)
     else:
-        # if x is less than the mean, the tail is what's less than x
-        return 2 * normal_probability_below(x, mu, sigma)
+        pool = None
+        blocks = (_simulate_block(job) for job in jobs)
+    
+    trials, rejections = 0, 0
+    try:
+        for block_trials, block_rejections in blocks:
+            trials += block_trials
+            rejections += block_rejections
+            lower, upper = rate_interval(rejections, trials, confidence)
+            yield RateEstimate(trials, rejections, rejections / trials,
+                               lower, upper)
+            if upper - lower <= 2 * precision:
+                break
+    finally:
+        if pool is not None:
+            # the blocks still being drawn aren't needed
+            pool.terminate()
+            pool.join()
+
+
+def rejection_rate(n, p, p_0=0.5, significance=0.05, **kwargs):
+    '''the final RateEstimate of simulate_rejections for the test of
+    p_0 at significance, when the coins really have P(heads) = p'''
+    lo, hi = rejection_region(n, p_0, significance)
+    for estimate in simulate_rejections(n, p, lo, hi, **kwargs):
+        pass
+    return estimate
+
+
+def false_positive_rate(n, p_0=0.5, significance=0.05, **kwargs):
+    return rejection_rate(n, p_0, p_0, significance, **kwargs)
+
+
+def power(n, p, p_0=0.5, significance=0.05, **kwargs):
+    return rejection_rate(n, p, p_0, significance, **kwargs)
+
+
+if __name__ == '__main__':
+    xs = np.array([x / 10.0 for x in range(-50, 50)])
+    pprint(xs)
+    mean = xs.mean()
+    std = xs.std()
+    print('mean: %f' % mean)
+    print('std: %f' % std)
+
+    pt = mean# + std
+    cdf = norm.cdf(pt, loc=mean)   # gets the probability (percent) that a random var <= pt
+    ppf = norm.ppf(cdf, loc=mean)  # gets the pt where the probability is the cdf
+
+    print('pt: %f' % pt)
+    print('cdf: %f as (percentage / 100)' % cdf)
+    print('ppf: %f as pt' % ppf)
+
+    print('')
+    print('-' * 40)
+    print('')
+
+    mu_0, sigma_0 = norm_approx_to_binomial(1000, 0.5)
+    print('samples: %d' % 1000)
+    print('prob: %f' % 0.5)
+    print('mu: %f, sigma: %f' % (mu_0, sigma_0))
+
+    # decide what is significant -> 5% chance of a false positive
+    lo, hi = norm_two_sided_bounds(.95, mu_0, sigma_0)
+    print('.95 around mean: %f, %f' % (lo, hi))
+
+    # 530 heads is close to the edge of that, 550 isn't
+    print('p value of 529.5 heads: %f' % two_sided_p_value(529.5, mu_0, sigma_0))
+    heads = np.array([480, 510, 529.5, 550, 570])
+    print('p values: %s' % two_sided_p_value(heads, mu_0, sigma_0))
+    print('benjamini-hochberg: %s'
+          % two_sided_p_value(heads, mu_0, sigma_0, 'benjamini-hochberg'))
+
+    print('')
+    print('-' * 40)
+    print('')
+
+    # how often the test above really rejects, with fair and biased coins
+    lo, hi = rejection_region(1000, 0.5)
+    for p in [0.5, 0.55]:
+        estimate = rejection_rate(1000, p, precision=0.0005, num_workers=4)
+        print('p: %.2f  rejected: %.4f (%.4f, %.4f) in %d trials  predicted: %.4f'
+              % (p, estimate.rate, estimate.lower, estimate.upper,
+                 estimate.trials, predicted_rejection_rate(1000, p, lo, hi)))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import cleandata
+
+
+# parsed csv files are cached as one .npy file per array, so later runs can
+# memory map the columns instead of parsing the text again.
+# each entry lives in its own directory named by a hash of the source
+# file's path, size, mtime and parser schema, so editing the source (or
+# changing the schema) just misses the cache
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'datasciencefromscratch')
+MAX_CACHE_BYTES = 1024 ** 3
+CACHE_VERSION = 3
+
+
+def defined_name(f):
+    '''module.name of a function or type, if that's where it can be found
+    again - not for lambdas, nested functions or closures, whose name
+    doesn't say what they do (two closures over different formats share
+    one), and on python 2 there's no __qualname__ to tell them apart'''
+    if getattr(f, '__closure__', None):
+        return None
+    
+    module_name = getattr(f, '__module__', None)
+    name = getattr(f, '__qualname__', f.__name__)
+    found = sys.modules.get(module_name)
+    for attribute in name.split('.'):
+        found = getattr(found, attribute, None)
+    if found is not f:
+        return None
+    return '%s.%s' % (module_name, name)
+
+
+def parser_name(parser):
+    '''a name for parser, and how it's configured, that is the same from
+    one run to the next - or None if it doesn't have one (see defined_name,
+    or an object without a repr of its own)'''
+    if parser is None:
+        return 'None'
+    
+    if hasattr(parser, '__name__'):
+        return defined_name(parser)
+    
+    # an instance, like DateParser('%m/%d/%Y'), whose repr shows its settings
+    description = repr(parser)
+    if ' at 0x' in description:  # the default repr, which is just its address
+        return None
+    return '%s.%s' % (type(parser).__module__, description)
+
+
+def cache_key(path, parser_dict, delimiter):
+    '''None when a parser has no stable name, since a different parser
+    with the same key would get this one's columns'''
+    schema = sorted((field, parser_name(parser))
+                    for field, parser in parser_dict.items())
+    if any(name is None for _, name in schema):
+        return None
+    
+    stat = os.stat(path)
+    key = repr((CACHE_VERSION, os.path.abspath(path), stat.st_size,
+                stat.st_mtime, delimiter, schema))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def save_array(directory, name, array):
+    np.save(os.path.join(directory, name + '.npy'), array,
+            allow_pickle=array.dtype == object)
+
+
+def load_array(directory, name):
+    '''memory maps the array, unless it holds python objects'''
+    filename = os.path.join(directory, name + '.npy')
+    try:
+        return np.load(filename, mmap_mode='r')
+    except ValueError:
+        return np.load(filename, allow_pickle=True)
+
+
+def write_entry(entry_dir, source, columns):
+    '''writes columns to a temporary directory, then renames it into
+    place so readers never see a half written entry'''
+    parent = os.path.dirname(entry_dir)
+    temp_dir = tempfile.mkdtemp(dir=parent)
+    try:
+        for i, name in enumerate(columns.names):
+            save_array(temp_dir, '%d.data' % i, columns.data[name])
+            save_array(temp_dir, '%d.errors' % i, columns.errors[name])
+            if name in columns.categories:
+                save_array(temp_dir, '%d.categories' % i,
+                           columns.categories[name])
+
+        stat = os.stat(source)
+        meta = {'source': os.path.abspath(source),
+                'source_size': stat.st_size,
+                'source_mtime': stat.st_mtime,
+                'names': columns.names,
+                'categorical': [name in columns.categories
+                                for name in columns.names]}
+        with open(os.path.join(temp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        os.rename(temp_dir, entry_dir)
+    except OSError:
+        # another process got there first
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def read_entry(entry_dir):
+    with open(os.path.join(entry_dir, 'meta.json')) as f:
+        meta = json.load(f)
+
+    # mark the entry as recently used for eviction
+    os.utime(os.path.join(entry_dir, 'meta.json'), None)
+
+    data, errors, categories = {}, {}, {}
+    for i, (name, categorical) in enumerate(zip(meta['names'],
+                                                meta['categorical'])):
+        data[name] = load_array(entry_dir, '%d.data' % i)
+        errors[name] = load_array(entry_dir, '%d.errors' % i)
+        if categorical:
+            categories[name] = load_array(entry_dir, '%d.categories' % i)
+
+    return cleandata.Columns(meta['names'], data, errors, categories)
+
+
+def cache_entries(cache_dir):
+    '''returns [(last used time, bytes, source, entry_dir)] for each entry
+    where source is the (path, size, mtime) of the file it was parsed from'''
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        meta_file = os.path.join(entry_dir, 'meta.json')
+        if not os.path.isfile(meta_file):
+            continue  # not an entry, or one still being written
+        with open(meta_file) as f:
+            meta = json.load(f)
+        source = (meta['source'], meta.get('source_size'), meta.get('source_mtime'))
+        size = sum(os.path.getsize(os.path.join(entry_dir, filename))
+                   for filename in os.listdir(entry_dir))
+        entries.append((os.path.getmtime(meta_file), size, source, entry_dir))
+    return entries
+
+
+def evict(cache_dir, max_bytes, keep):
+    '''removes the entries for older versions of keep's source file (the
+    same path with a different size or mtime - entries of the same version
+    parsed with another schema or delimiter stay), then the least recently
+    used entries until the cache fits in max_bytes'''
+    entries = cache_entries(cache_dir)
+    keep_source = dict((entry_dir, source)
+                       for _, _, source, entry_dir in entries).get(keep)
+
+    survivors = []
+    for entry in entries:
+        _, _, source, entry_dir = entry
+        if (entry_dir != keep and keep_source is not None and
+                source[0] == keep_source[0] and source != keep_source):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        else:
+            survivors.append(entry)
+
+    total = sum(size for _, size, _, _ in survivors)
+    for _, size, _, entry_dir in sorted(survivors, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        if entry_dir != keep:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+
+def load_columns_cached(path, parser_dict, delimiter=',',
+                        cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    '''cleandata.load_columns for the file at path, reusing the
+    memory mapped columns from an earlier run when the file hasn't changed
+    (parsers without a stable name, like lambdas, aren't cached)'''
+    key = cache_key(path, parser_dict, delimiter)
+    if key is None:
+        # can't tell this schema from another, so don't cache it
+        with open(path, 'rb') as f:
+            return cleandata.load_columns(f, parser_dict, delimiter)
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    entry_dir = os.path.join(cache_dir, key)
+    if os.path.isdir(entry_dir):
+        return read_entry(entry_dir)
+
+    with open(path, 'rb') as f:
+        columns = cleandata.load_columns(f, parser_dict, delimiter)
+
+    write_entry(entry_dir, path, columns)
+    evict(cache_dir, max_bytes, keep=entry_dir)
+    return read_entry(entry_dir)
+
+
+if __name__ == '__main__':
+    parser_dict = {'date': cleandata.DateParser(),
+                   'closing_price': float}
+
+    for _ in range(2):
+        columns = load_columns_cached('stocks.csv', parser_dict, delimiter='\t')
+        print('%d rows, closing_price: %s' % (len(columns),
+                                              type(columns['closing_price'])))
@@ -2,13 +2,12 @@
 
 from __future__ import division
 import math
-import random
 import numpy as np
 from matplotlib import pyplot as plt
-from scipy.stats import norm
 from pprint import pprint
 from collections import Counter
-from utils import correlation
+from utils import correlation, BLOCK_SIZE, share, shared, shared_pool
+from sampling import Sampler
 
 
 def bucketize(point, bucket_size):
@@ -17,39 +16,153 @@ def bucketize(point, bucket_size):
 
 
 def make_histogram(points, bucket_size):
-    return Counter(bucketize(point, bucket_size) for point in points)
+    '''Counter of bucket -> number of points, as bucketize would count them'''
+    return Histogram(bucket_size, points).to_counter()
+
+
+class Histogram(object):
+    '''counts of points in fixed size buckets, binned a whole array at a time
+    the counts are one dense array for the buckets from offset * bucket_size
+    up, which grows at either end as points outside it come in - unless
+    that would span more than max_dense_buckets (8MB of counts), e.g. for
+    heavy tailed data or a far outlier, when it switches to sorted arrays
+    of just the non-empty buckets (sparse_indexes) and their counts'''
+    
+    max_dense_buckets = 1 << 20
+    
+    def __init__(self, bucket_size, points=()):
+        self.bucket_size = bucket_size
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sparse_indexes = None
+        self.num_points = 0
+        self.update(points)
+    
+    def bucket_indexes(self, points):
+        '''floor(point / bucket_size) of each point, as bucketize does'''
+        points = np.asarray(points, dtype=float)
+        if not np.isfinite(points).all():
+            raise ValueError('can only histogram finite points')
+        indexes = np.floor(points / self.bucket_size)
+        if len(indexes) and np.abs(indexes).max() >= 2.0 ** 63:
+            raise ValueError('bucket indexes overflow int64')
+        return indexes.astype(np.int64)
+    
+    def fits_dense(self, low, high):
+        '''whether the dense counts can grow to the buckets low to high'''
+        if self.sparse_indexes is not None:
+            return False
+        low, high = int(low), int(high)
+        if len(self.counts):
+            low = min(low, self.offset)
+            high = max(high, self.offset + len(self.counts) - 1)
+        return high - low + 1 <= self.max_dense_buckets
+    
+    def grow(self, low, high):
+        '''make room for the buckets with indexes low to high'''
+        if len(self.counts) == 0:
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.int64)
+            return
+        
+        end = self.offset + len(self.counts) - 1
+        if low < self.offset or high > end:
+            new_offset = min(low, self.offset)
+            counts = np.zeros(max(high, end) - new_offset + 1, dtype=np.int64)
+            start = self.offset - new_offset
+            counts[start:start + len(self.counts)] = self.counts
+            self.offset, self.counts = new_offset, counts
+    
+    def add_sparse(self, indexes, counts):
+        '''add counts to the buckets at (sorted, distinct) indexes, going
+        sparse first if the histogram is still dense'''
+        if self.sparse_indexes is None:
+            self.sparse_indexes, self.counts = self.nonempty()
+        merged, inverse = np.unique(np.concatenate([self.sparse_indexes, indexes]),
+                                    return_inverse=True)
+        merged_counts = np.zeros(len(merged), dtype=np.int64)
+        np.add.at(merged_counts, inverse, np.concatenate([self.counts, counts]))
+        self.sparse_indexes, self.counts = merged, merged_counts
+    
+    def update(self, points, block_size=BLOCK_SIZE):
+        '''add a chunk of points, block_size at a time so the temporary
+        arrays stay small however big the chunk is'''
+        points = np.ravel(points)
+        for start in range(0, len(points), block_size):
+            indexes = self.bucket_indexes(points[start:start + block_size])
+            self.num_points += len(indexes)
+            low, high = indexes.min(), indexes.max()
+            if self.fits_dense(low, high):
+                self.grow(low, high)
+                self.counts += np.bincount(indexes - self.offset,
+                                           minlength=len(self.counts))
+            else:
+                self.add_sparse(*np.unique(indexes, return_counts=True))
+        return self
+    
+    def merge(self, other):
+        '''fold in the counts of a histogram of other points (e.g. from a worker)'''
+        if other.bucket_size != self.bucket_size:
+            raise ValueError('can only merge histograms with the same bucket size')
+        if other.num_points == 0:
+            return self
+        
+        self.num_points += other.num_points
+        indexes, counts = other.nonempty()
+        other_end = other.offset + len(other.counts) - 1
+        if other.sparse_indexes is None and self.fits_dense(other.offset, other_end):
+            self.grow(other.offset, other_end)
+            start = other.offset - self.offset
+            self.counts[start:start + len(other.counts)] += other.counts
+        else:
+            self.add_sparse(indexes, counts)
+        return self
+    
+    def nonempty(self):
+        '''returns (bucket indexes, counts) of the non-empty buckets, in order'''
+        if self.sparse_indexes is not None:
+            return self.sparse_indexes, self.counts
+        nonempty = np.nonzero(self.counts)[0]
+        return self.offset + nonempty, self.counts[nonempty]
+    
+    def buckets(self):
+        '''returns (bucket edges, counts) of the non-empty buckets, in order'''
+        indexes, counts = self.nonempty()
+        return self.bucket_size * indexes, counts
+    
+    def to_counter(self):
+        edges, counts = self.buckets()
+        return Counter(dict(zip(edges.tolist(), counts.tolist())))
 
 
 def plot_histogram(points, bucket_size, title=''):
-    histogram = make_histogram(points, bucket_size)
-    plt.bar(histogram.keys(), histogram.values(), width=bucket_size)
+    '''points can also be an already built Histogram'''
+    histogram = (points if isinstance(points, Histogram)
+                 else Histogram(bucket_size, points))
+    edges, counts = histogram.buckets()
+    plt.bar(edges, counts, width=histogram.bucket_size)
     plt.title(title)
     plt.show()
 
 
 def plot1d():
-    random.seed(0)
+    sampler = Sampler(seed=0)
     
     # uniform between -100 and 100
-    uniform = [200 * random.random() - 100 for _ in range(10000)]
+    uniform = sampler.uniform(-100, 100, 10000)
     
     # normal distribution with mean 0, standard deviation 57
-    normal = [57 * norm.ppf(random.random())
-              for _ in range(10000)]
+    normal = sampler.normal(0, 57, 10000)
     
     plot_histogram(uniform, 10, "Uniform Histogram")
     plot_histogram(normal, 10, "Normal Histogram")
 
 
-def random_normal():
-    '''returns a random draw from a standard normal distribution'''
-    return norm.ppf(random.random())
-
-
 def plot2d():
-    xs = [random_normal() for _ in range(1000)]
-    ys1 = [x + random_normal() / 2 for x in xs]
-    ys2 = [-x + random_normal() / 2 for x in xs]
+    sampler = Sampler(seed=0)
+    xs = sampler.normal(size=1000)
+    ys1 = xs + sampler.normal(size=1000) / 2
+    ys2 = -xs + sampler.normal(size=1000) / 2
     
     print(correlation(xs, ys1))
     print(correlation(xs, ys2))
@@ -63,31 +176,121 @@ def plot2d():
     plt.show()
 
 
-def correlation_matrix(data):
+def standardize_columns(data):
+    '''returns the z scores of each column of data divided by sqrt(n),
+    so that z.T * z is the correlation matrix
+    (columns with no deviation become all 0, as correlation returns 0)'''
+    z = np.array(data, dtype=float)
+    num_rows, _ = z.shape
+    
+    stdevs = z.std(axis=0)
+    stdevs[stdevs == 0] = np.inf
+    z -= z.mean(axis=0)
+    z /= stdevs * math.sqrt(num_rows)
+    return z
+
+
+# the workers read the standardized data through utils.shared()
+def _correlation_tile(tile):
+    (i0, i1), (j0, j1) = tile
+    z, = shared()
+    return tile, np.dot(z[:, i0:i1].T, z[:, j0:j1])
+
+
+def correlation_matrix(data, block_size=256, num_workers=1):
     '''returns the num_columns x num_columns matrix whose (i, j)th entry
-    is the correlation between columns i and j of data'''
+    is the correlation between columns i and j of data
+    
+    standardizes data once, then computes the upper triangle of z.T * z
+    block_size columns at a time (on num_workers processes when > 1)
+    and mirrors it into the lower triangle'''
     
-    _, num_columns = data.shape()
+    z = standardize_columns(data)
+    _, num_columns = z.shape
+    
+    blocks = [(start, min(start + block_size, num_columns))
+              for start in range(0, num_columns, block_size)]
+    tiles = [(blocks[i], blocks[j])
+             for i in range(len(blocks))
+             for j in range(i, len(blocks))]
+    
+    if num_workers > 1 and len(tiles) > 1:
+        pool = shared_pool(num_workers, z)
+        try:
+            products = pool.imap_unordered(_correlation_tile, tiles)
+            corr = _fill_tiles(num_columns, products)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        share(z)
+        try:
+            corr = _fill_tiles(num_columns, map(_correlation_tile, tiles))
+        finally:
+            share()
+    
+    return np.matrix(corr)
+
+
+def _fill_tiles(num_columns, products):
+    corr = np.empty((num_columns, num_columns))
+    for ((i0, i1), (j0, j1)), product in products:
+        corr[i0:i1, j0:j1] = product
+        corr[j0:j1, i0:i1] = product.T
+    return corr
+
+
+def streaming_correlation_matrix(chunks):
+    '''same as correlation_matrix, for data that comes in chunks of rows
+    keeps a running count, mean vector and co-moment matrix
+    (the sum of the outer products of the deviations from the mean)
+    merged chunk by chunk like utils.CoMoments'''
+    count, means, co_moments = 0, 0.0, 0.0
     
-    def matrix_entry(i, j):
-        return correlation(data[:,i], data[:,j])
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=float)
+        chunk_count = len(chunk)
+        if chunk_count == 0:
+            continue
+        chunk_means = chunk.mean(axis=0)
+        deviations = chunk - chunk_means
+        chunk_co_moments = np.dot(deviations.T, deviations)
+        
+        total = count + chunk_count
+        delta = chunk_means - means
+        co_moments = (co_moments + chunk_co_moments +
+                      np.outer(delta, delta) * (count * chunk_count / total))
+        means = means + delta * (chunk_count / total)
+        count = total
     
-    return make_matrix(num_columns, num_columns, matrix_entry)
+    # the diagonal holds each column's sum of squared deviations
+    scales = np.sqrt(np.diag(co_moments))
+    scales[scales == 0] = np.inf
+    return np.matrix(co_moments / np.outer(scales, scales))
+
+
+def random_rows(num_rows, sampler=None):
+    '''num_rows x 4 array of random rows, built a column at a time from
+    one block of normal draws - from sampler, or a fresh unseeded one'''
+    if sampler is None:
+        sampler = Sampler(seed=None)
+    z = sampler.normal(size=(num_rows, 3))
+    rows = np.empty((num_rows, 4))
+    rows[:, 0] = z[:, 0]
+    rows[:, 1] = -5 * rows[:, 0] + z[:, 1]
+    rows[:, 2] = rows[:, 0] + rows[:, 1] + 5 * z[:, 2]
+    rows[:, 3] = np.where(rows[:, 2] > -2, 6, 0)
+    return rows
+
+
+def random_row(sampler=None):
+    return random_rows(1, sampler)[0].tolist()
 
 
 def plot_correlation_matrix():
     num_points = 100
     
-    def random_row():
-        row = [None, None, None, None]
-        row[0] = random_normal()
-        row[1] = -5 * row[0] + random_normal()
-        row[2] = row[0] + row[1] + 5 * random_normal()
-        row[3] = 6 if row[2] > -2 else 0
-        return row
-    
-    random.seed(0)
-    data = np.matrix([random_row() for _ in range(num_points)])
+    data = np.matrix(random_rows(num_points, Sampler(seed=0)))
     _, num_columns = data.shape
     fig, ax = plt.subplots(num_columns, num_columns)
     
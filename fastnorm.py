@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import numpy as np
+from scipy.stats import norm as scipy_norm
+
+
+# table lookup versions of scipy.stats.norm's cdf, ppf and sf, and a direct
+# pdf, for hot loops that can trade a little accuracy for speed. they take
+# the same (x, loc=0, scale=1) arguments, so this module can stand in for norm
+#
+# the tables hold the standard normal's cdf at SIZE evenly spaced
+# points from -X_MAX to X_MAX (h = 2 * X_MAX / (SIZE - 1) apart), built the
+# first time they're needed, and values in between are linearly
+# interpolated. linear interpolation is off by at most h**2 / 8 times the
+# biggest second derivative, which for the defaults (h ~ 0.000244) gives
+#   cdf, sf: absolute error < 1.9e-9   (|cdf''| <= pdf(1) ~ 0.242)
+# ppf's table is of the lower tail, p from cdf(-X_MAX) to 1/2, at evenly
+# spaced t = sqrt(-2 log p), which the ppf is nearly a straight line in
+#   ppf:     absolute error < 1e-9     (measured, see __main__)
+# (ppf(p) = -ppf(1 - p) for the upper half)
+# these are absolute errors, so far out in the tails, where the cdf itself
+# is tiny, the relative error is much bigger. anything beyond the tables
+# (|z| > X_MAX, or p below cdf(-X_MAX) or above 1 - that) goes to scipy
+#
+# the points of each table are evenly spaced, so a value's place in the
+# table is found with arithmetic rather than a binary search
+#
+# pdf needs no table: exp(-z*z/2) / sqrt(2 pi) / scale is quicker than a
+# lookup, and as accurate as scipy. scalar calls gain the most (scipy's per
+# call overhead is most of their cost); per element of a 10**6 array
+# (benchmarks.py fastnorm) it's
+#   cdf: ~21ns against scipy's ~47ns
+#   pdf:  ~7ns against scipy's ~32ns
+#   ppf: ~50ns against scipy's ~59ns - only 1.2x, so little to gain there
+X_MAX = 8.0
+SIZE = (1 << 16) + 1
+
+_tables = None
+
+def interpolation_table(xs, values):
+    '''(first x, x step, values, slope from each value to the next)'''
+    return xs[0], xs[1] - xs[0], values, np.append(np.diff(values), 0.0)
+
+
+def tables():
+    '''returns the cdf and ppf interpolation tables, built on first use'''
+    global _tables
+    if _tables is None:
+        zs = np.linspace(-X_MAX, X_MAX, SIZE)
+        ts = np.linspace(np.sqrt(2 * np.log(2)),
+                         np.sqrt(-2 * np.log(scipy_norm.cdf(-X_MAX))), SIZE)
+        _tables = {'cdf': interpolation_table(zs, scipy_norm.cdf(zs)),
+                   'ppf': interpolation_table(ts, scipy_norm.ppf(np.exp(-ts * ts / 2)))}
+    return _tables
+
+
+def interpolate(x, table, exact):
+    '''interpolates table at each x, using exact for the x's off the table'''
+    start, step, values, slopes = table
+    position = (x - start) / step
+    off_table = ~((position >= 0) & (position <= len(values) - 1))  # or nan
+    if np.any(off_table):
+        position = np.where(off_table, 0.0, position)
+    i = position.astype(np.intp)
+    result = values[i] + (position - i) * slopes[i]
+    if np.any(off_table):
+        result = np.array(result)
+        result[off_table] = exact(x[off_table])
+    return result[()] if np.ndim(result) == 0 else result
+
+
+def standardize(x, loc, scale):
+    return (np.asarray(x, dtype=float) - loc) / scale
+
+
+def cdf(x, loc=0, scale=1):
+    return interpolate(standardize(x, loc, scale), tables()['cdf'], scipy_norm.cdf)
+
+
+def sf(x, loc=0, scale=1):
+    # sf(x) = cdf(-x), which keeps the small upper tail accurate
+    return interpolate(-standardize(x, loc, scale), tables()['cdf'], scipy_norm.cdf)
+
+
+def pdf(x, loc=0, scale=1):
+    z = standardize(x, loc, scale)
+    return np.exp(-z * z / 2) / (np.sqrt(2 * np.pi) * scale)
+
+
+def lower_tail_ppf(t):
+    '''scipy's ppf of the p with t = sqrt(-2 log p)'''
+    return scipy_norm.ppf(np.exp(-t * t / 2))
+
+
+def ppf(q, loc=0, scale=1):
+    '''inverse of cdf'''
+    q = np.asarray(q, dtype=float)
+    upper = q > 0.5
+    tail = np.where(upper, 1 - q, q)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # q outside 0..1 gives nan, which goes to scipy (and comes back nan)
+        t = np.sqrt(-2 * np.log(tail))
+    z = interpolate(t, tables()['ppf'], lower_tail_ppf)
+    return loc + scale * np.where(upper, -z, z)[()]
+
+
+if __name__ == '__main__':
+    xs = np.linspace(-10, 10, 1000001)
+    ps = np.linspace(0, 1, 1000001)
+    print('max cdf error: %g' % np.abs(cdf(xs) - scipy_norm.cdf(xs)).max())
+    print('max sf error:  %g' % np.abs(sf(xs) - scipy_norm.sf(xs)).max())
+    print('max pdf error: %g' % np.abs(pdf(xs) - scipy_norm.pdf(xs)).max())
+    inner = ps[1:-1]
+    print('max ppf error: %g' % np.abs(ppf(inner) - scipy_norm.ppf(inner)).max())
+    tails = np.logspace(-15, np.log10(0.5), 1000001)
+    print('max ppf error in the tails: %g'
+          % np.abs(ppf(tails) - scipy_norm.ppf(tails)).max())
@@ -4,6 +4,8 @@ from __future__ import division
 from pprint import pprint
 from collections import Counter
 from collections import defaultdict
+import socialgraph
+import interests as interests_module
 
 
 users = [
@@ -54,6 +56,12 @@ num_friends_by_id = \
 print('num_friends_by_id:')
 pprint(num_friends_by_id)
 
+# the same numbers kept up to date as friendships come and go
+live_stats = socialgraph.LiveNetworkStats(num_users, friendships)
+print('live total_connections: %d' % live_stats.total_connections)
+print('live avg_connections: %f' % live_stats.avg_connections)
+pprint(live_stats.top(num_users))
+
 def friends_of_friends_ids_bad(user):
     '''returns foaf id list, but may contain duplicate ids'''
     return [foaf['id']
@@ -83,6 +91,10 @@ def friends_of_friends_ids(user):
 print('friends_of_friends_ids %s:' % str(users[3]['name']))
 print(friends_of_friends_ids(users[3]))
 
+# the same from the compressed sparse graph, which scales to big networks
+graph = socialgraph.FriendGraph.from_edges(friendships, num_users)
+print(graph.friends_of_friends_ids(users[3]['id']))
+
 
 interests = [
     (0, "Hadoop"), (0, "Big Data"), (0, "HBase"), (0, "Java"),
@@ -121,15 +133,21 @@ for user_id, user_interest in interests:
     
 
 def most_common_interests_with(user):
-    Counter(interested_user_id
-            for interest in interests_by_user_id[user['id']]  # for each of the user's interests
-            for interested_user_id in user_ids_by_interest[interest]  # count user ids who share the interest
-            if interested_user_id != user['id'])  # who is not the user
+    return Counter(interested_user_id
+                   for interest in interest_by_user_id[user['id']]  # for each of the user's interests
+                   for interested_user_id in user_ids_by_interest[interest]  # count user ids who share the interest
+                   if interested_user_id != user['id'])  # who is not the user
+
+print('most_common_interests_with %s:' % str(users[0]['name']))
+print(most_common_interests_with(users[0]))
+
+# the same from the inverted index, which doesn't rescan the interests
+interest_index = interests_module.InterestIndex(interests)
+print(interest_index.users_who_like('Big Data'))
+print(interest_index.most_similar(users[0]['id']))
 
 
-words_and_counts = Counter(word
-                           for user_id, interest in interests
-                           for word in interest.lower().split())
+words_and_counts = interests_module.count_terms(interests)
 
 for word, count in words_and_counts.most_common():
     if count > 1:
@@ -2,21 +2,29 @@
 
 from __future__ import division
 import math
+import json
+import random
+import bisect
+import timeit
 import numpy as np
 from matplotlib import pyplot as plt
 from scipy.stats import norm
 from pprint import pprint
+from collections import namedtuple
+from utils import share, shared, shared_pool
 
 
 # estimates the derivative (slope) of f
 def difference_quotient(f, x, h):
-    return (f(x+h) - f(x) / h)
+    return (f(x+h) - f(x)) / h
 
 
 def partial_difference_quotient(f, v, i, h):
     '''compute the ith partial difference quotient of f at c'''
     w = [v_j + (h if j == i else 0)
          for j, v_j in enumerate(v)]
+    
+    return (f(w) - f(v)) / h
 
 
 def estimate_gradient(f, v, h=0.00001):
@@ -24,6 +32,62 @@ def estimate_gradient(f, v, h=0.00001):
             for i, _ in enumerate(v)]
 
 
+# vectorized estimate - all the perturbed points are rows of one array,
+# evaluated in one call when f takes a batch of points,
+# or spread over a pool of processes when f is expensive
+def _apply_f(point):
+    f, = shared()
+    return f(point)
+
+
+def evaluate_points(f, points, batched=False, num_workers=1):
+    '''returns the array of f at each row of points'''
+    if batched:
+        return np.asarray(f(points), dtype=float)
+    if num_workers > 1:
+        pool = shared_pool(num_workers, f)
+        try:
+            chunksize = max(1, len(points) // (4 * num_workers))
+            return np.array(pool.map(_apply_f, points, chunksize), dtype=float)
+        finally:
+            pool.close()
+            pool.join()
+    return np.array([f(point) for point in points], dtype=float)
+
+
+def estimate_gradient_array(f, v, h=0.00001, central=False, batched=False,
+                            num_workers=1):
+    '''estimate_gradient with every perturbation of v built as one array
+    uses forward differences (f(v + h) - f(v)) / h by default, or the more
+    accurate central differences (f(v + h) - f(v - h)) / 2h
+    if batched, f takes the (n, d) array of points and returns n values'''
+    v = np.asarray(v, dtype=float)
+    steps = h * np.eye(len(v))
+    
+    if central:
+        values = evaluate_points(f, np.vstack([v + steps, v - steps]),
+                                 batched, num_workers)
+        forward, backward = values[:len(v)], values[len(v):]
+        return (forward - backward) / (2 * h)
+    
+    values = evaluate_points(f, np.vstack([v, v + steps]), batched, num_workers)
+    return (values[1:] - values[0]) / h
+
+
+GradientCheck = namedtuple('GradientCheck', ['analytic', 'estimate', 'max_error', 'ok'])
+
+def check_gradient(f, gradient_fn, v, h=0.00001, tolerance=0.0001,
+                   batched=False, num_workers=1):
+    '''compares gradient_fn(v) with a central difference estimate
+    max_error is the largest error relative to the size of the gradient
+    (absolute for components smaller than 1)'''
+    analytic = np.asarray(gradient_fn(v), dtype=float)
+    estimate = estimate_gradient_array(f, v, h, True, batched, num_workers)
+    scale = np.maximum(1, np.maximum(np.abs(analytic), np.abs(estimate)))
+    max_error = np.max(np.abs(analytic - estimate) / scale) if len(scale) else 0.0
+    return GradientCheck(analytic, estimate, max_error, max_error <= tolerance)
+
+
 def step(v, direction, step_size):
     '''move step_size in the direction from v'''
     return [v_i + step_size * direction_i
@@ -47,21 +111,6 @@ def distance(v, w):
     return magnitude(np.subtract(v, w))
 
 
-v = [random.randint(-10, 10) for i in range(3)]
-
-tolerance = 0.0000001
-
-while True:
-    gradient = sum_of_squares_gradient(v)
-    next_v = step(v, gradient, -0.01)
-    if distance(next_v, v) < tolerance:
-        break
-    v = next_v
-
-print(v)
-print('-' * 40)
-
-
 def safe(f):
     """return a new function that's the same as f,
     except that it outputs infinity whenever f produces an error"""
@@ -73,28 +122,248 @@ def safe(f):
     return safe_f
 
 
+# tracing - pass a Tracer to a minimizer to see where its time goes.
+# with the default tracer=None the loops only pay for an "is not None" check
+
+class Tracer(object):
+    '''counts function and gradient evaluations, keeps a histogram of
+    the seconds spent in each phase of an iteration, and records each
+    iteration (calling every callback with the record; a callback that
+    returns True stops the run)'''
+    
+    # histogram bucket edges in seconds, 1us to 10s, 4 per decade
+    bucket_edges = [10 ** (exponent / 4) for exponent in range(-24, 5)]
+    
+    def __init__(self, callbacks=(), keep_records=True):
+        self.callbacks = list(callbacks)
+        self.keep_records = keep_records
+        self.records = []
+        self.counters = {}
+        self.histograms = {}
+        self.phase_seconds = {}
+        self.iterations = 0
+        self.current = {}
+    
+    clock = staticmethod(timeit.default_timer)
+    
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+    
+    def time(self, phase, since):
+        '''adds the time since since to phase, returns now'''
+        now = timeit.default_timer()
+        seconds = now - since
+        if phase not in self.histograms:
+            self.histograms[phase] = [0] * (len(self.bucket_edges) + 1)
+            self.phase_seconds[phase] = 0.0
+        self.histograms[phase][bisect.bisect(self.bucket_edges, seconds)] += 1
+        self.phase_seconds[phase] += seconds
+        self.current[phase] = self.current.get(phase, 0.0) + seconds
+        return now
+    
+    def iteration(self, **fields):
+        '''ends an iteration, returns True if a callback asked to stop'''
+        record = dict((name, float(value)) for name, value in fields.items())
+        record['iteration'] = self.iterations
+        record['seconds'] = self.current
+        self.iterations += 1
+        self.current = {}
+        
+        if self.keep_records:
+            self.records.append(record)
+        return any([callback(record) for callback in self.callbacks])
+    
+    def summary(self):
+        return {'iterations': self.iterations,
+                'counters': self.counters,
+                'phase_seconds': self.phase_seconds,
+                'bucket_edges': self.bucket_edges,
+                'histograms': self.histograms}
+    
+    def to_jsonl(self, f):
+        '''writes one json line per iteration record, then the summary'''
+        for record in self.records:
+            f.write(json.dumps(record) + '\n')
+        f.write(json.dumps({'summary': self.summary()}) + '\n')
+
+
 # example: target_fn represents the errors in a model, find the theta (params) that minimize the errors
-def minimize_batch(target_fn, gradient_fn, theta_0, tolerance=0.000001):
+def minimize_batch(target_fn, gradient_fn, theta_0, tolerance=0.000001,
+                   batched=False, tracer=None, line_search=None):
     '''use gradient descent to find theta that minimizes target function'''
+    return minimize_batch_with_stats(target_fn, gradient_fn, theta_0,
+                                     tolerance, batched, tracer,
+                                     line_search).theta
+
+
+step_sizes = [100, 10, 1, 0.1, 0.01, 0.001, 0.0001, 0.00001]
+
+# what a run of minimize_batch_with_stats found, and what it cost
+MinimizeResult = namedtuple('MinimizeResult',
+                            ['theta', 'value', 'iterations',
+                             'evaluations', 'seconds'])
+
+
+def batch_evaluator(target_fn, batched=False):
+    '''returns a function that takes a (k, d) array of thetas and returns
+    an array of their k values, inf wherever target_fn fails
+    if batched, target_fn already takes the (k, d) array in one call'''
+    def as_values(values):
+        values = np.asarray(values, dtype=float)
+        values[np.isnan(values)] = float('inf')
+        return values
     
-    step_sizes = [100, 10, 1, 0.1, 0.01, 0.001, 0.0001, 0.00001]
+    if not batched:
+        safe_fn = safe(target_fn)
+        return lambda thetas: as_values([safe_fn(theta) for theta in thetas])
+    
+    # if the whole batch fails, find out which thetas it failed on
+    safe_row_fn = safe(lambda theta: target_fn(theta[np.newaxis])[0])
+    
+    def evaluate(thetas):
+        try:
+            return as_values(target_fn(thetas))
+        except Exception:
+            return as_values([safe_row_fn(theta) for theta in thetas])
+    return evaluate
+
 
-    theta = theta_0                           # set theta to initial value
-    target_fn = safe(target_fn)               # safe version of target_fn
-    value = target_fn(theta)                  # value we're minimizing
+# line searches - how far to step along the negative gradient.
+# search(evaluate, theta, value, gradient) returns
+# (next_theta, next_value, step_size, number of thetas evaluated), and
+# converged(value, next_value, step_size, gradient, tolerance) says when
+# minimize_batch should stop
+
+class FixedGridSearch(object):
+    '''tries every one of step_sizes (in one batch) and takes the best,
+    the original minimize_batch behaviour'''
+    
+    def __init__(self, step_sizes=step_sizes):
+        self.step_sizes = np.array(step_sizes, dtype=float)
+    
+    def search(self, evaluate, theta, value, gradient):
+        next_thetas = theta - self.step_sizes[:, np.newaxis] * gradient
+        next_values = evaluate(next_thetas)
+        best = np.argmin(next_values)
+        return (next_thetas[best], next_values[best], self.step_sizes[best],
+                len(next_thetas))
+    
+    def converged(self, value, next_value, step_size, gradient, tolerance):
+        '''the original stopping rule: the value barely changed'''
+        return abs(value - next_value) < tolerance
+
+
+class BacktrackingArmijo(object):
+    '''starts from initial_step and shrinks the step until it decreases
+    the value by at least c * step * |gradient|^2 (the armijo condition)'''
+    
+    def __init__(self, initial_step=1.0, shrink=0.5, c=0.0001,
+                 max_backtracks=50, gradient_tolerance=0.0001):
+        self.initial_step = initial_step
+        self.shrink = shrink
+        self.c = c
+        self.max_backtracks = max_backtracks
+        self.gradient_tolerance = gradient_tolerance
+    
+    def first_step(self):
+        return self.initial_step
+    
+    def accepted(self, step_size):
+        pass
+    
+    def search(self, evaluate, theta, value, gradient):
+        slope = np.dot(gradient, gradient)
+        step_size = self.first_step()
+        
+        for evaluations in range(1, self.max_backtracks + 1):
+            next_theta = theta - step_size * gradient
+            next_value = evaluate(next_theta[np.newaxis])[0]
+            if next_value <= value - self.c * step_size * slope:
+                self.accepted(step_size)
+                return next_theta, next_value, step_size, evaluations
+            step_size *= self.shrink
+        
+        # no step helped, so stay put (which ends the minimization)
+        return theta, value, 0.0, self.max_backtracks
+    
+    def converged(self, value, next_value, step_size, gradient, tolerance):
+        '''a small change in value only means convergence here if the
+        gradient is small too: armijo accepts the first step that decreases
+        the value enough, and a short one decreases it by little even far
+        from the minimum (step_size * |gradient|^2 is the decrease a step
+        of that length would give if the slope held). the gradient's length
+        is compared to gradient_tolerance, relative to the value's size
+        when that's over 1, so scaling the target doesn't change when it stops'''
+        if step_size == 0:
+            return True
+        return (abs(value - next_value) < tolerance and
+                np.sqrt(np.dot(gradient, gradient)) <
+                self.gradient_tolerance * max(1.0, abs(value)))
+
+
+class CachedStepArmijo(BacktrackingArmijo):
+    '''backtracking armijo that starts each search from the last accepted
+    step grown by growth, so a well scaled problem usually needs one
+    evaluation per iteration'''
+    
+    def __init__(self, initial_step=1.0, shrink=0.5, c=0.0001,
+                 max_backtracks=50, gradient_tolerance=0.0001, growth=2.0):
+        BacktrackingArmijo.__init__(self, initial_step, shrink, c,
+                                    max_backtracks, gradient_tolerance)
+        self.growth = growth
+        self.last_step = None
+    
+    def first_step(self):
+        if self.last_step is None:
+            return self.initial_step
+        return self.last_step * self.growth
+    
+    def accepted(self, step_size):
+        self.last_step = step_size
+
+
+def minimize_batch_with_stats(target_fn, gradient_fn, theta_0,
+                              tolerance=0.000001, batched=False, tracer=None,
+                              line_search=None):
+    '''minimize_batch on ndarray thetas, returning a MinimizeResult
+    line_search is a CachedStepArmijo() by default. this changed from the
+    FixedGridSearch() of step_sizes minimize_batch used to do: it takes
+    far fewer evaluations and stops on a small gradient as well as a small
+    change in value, so results differ slightly from before - pass
+    line_search=FixedGridSearch() to get the old steps back'''
+    start = timeit.default_timer()
+    evaluate = batch_evaluator(target_fn, batched)
+    line_search = line_search or CachedStepArmijo()
+    
+    theta = np.array(theta_0, dtype=float)    # set theta to initial value
+    value = evaluate(theta[np.newaxis])[0]    # value we're minimizing
+    iterations, evaluations = 0, 1
     
     while True:
-        gradient = gradient_fn(theta)
-        next_thetas = [step(theta, gradient, -step_size)
-                       for step_size in step_sizes]
+        if tracer is not None: now = tracer.clock()
+        gradient = np.asarray(gradient_fn(theta), dtype=float)
+        if tracer is not None: now = tracer.time('gradient', now)
+        
+        # choose how far to step
+        next_theta, next_value, step_size, searched = \
+            line_search.search(evaluate, theta, value, gradient)
+        iterations += 1
+        evaluations += searched
         
-        # choose the one that minimizes the error Function
-        next_theta = min(next_thetas, key=target_fn)
-        next_value = target_fn(next_theta)
+        stop = False
+        if tracer is not None:
+            tracer.time('line_search', now)
+            tracer.count('gradient_evaluations')
+            tracer.count('target_evaluations', searched)
+            stop = tracer.iteration(value=next_value,
+                                    step_size=step_size,
+                                    improvement=value - next_value)
         
         # stop if we're converging
-        if abs(value - next_value) < tolerance:
-            return theta
+        if line_search.converged(value, next_value, step_size, gradient,
+                                 tolerance) or stop:
+            return MinimizeResult(theta, value, iterations, evaluations,
+                                  timeit.default_timer() - start)
         else:
             theta, value = next_theta, next_value
             
@@ -107,11 +376,127 @@ def negate_all(f):
     '''the same when f returns a list of numbers'''
     return lambda *args, **kwargs: [-y for y in f(*args, **kwargs)]
 
-def maximize_batch(target_fn, gradient_fn, theta_0, tolerance=0.000001):
+def maximize_batch(target_fn, gradient_fn, theta_0, tolerance=0.000001,
+                   batched=False, tracer=None, line_search=None):
     return minimize_batch(negate(target_fn),
                           negate_all(gradient_fn),
                           theta_0,
-                          tolerance)
+                          tolerance,
+                          batched,
+                          tracer,
+                          line_search)
+
+
+# multi-start - for non-convex targets, run minimize_batch from many
+# starting points (on a pool of processes) and keep the best run.
+# run i is seeded with seed + i, and an early stop only skips the runs
+# after the first one (by index) that reaches target_value, so the
+# winner doesn't depend on how many workers there are or how they're scheduled
+
+# one run of a multi-start: status is 'done', 'skipped' or 'timeout'
+StartRun = namedtuple('StartRun', ['index', 'seed', 'theta_0', 'status', 'result'])
+
+MultistartResult = namedtuple('MultistartResult', ['best', 'runs'])
+
+# the worker processes read the functions and counters through
+# utils.shared() - the pool is forked, so the functions don't need to be
+# picklable
+def _run_start(job):
+    index, seed, theta_0 = job
+    target_fn, gradient_fn, tolerance, batched, target_value, first_hit = shared()
+    
+    if index > first_hit.value:
+        return index, None  # an earlier run already reached target_value
+    
+    random.seed(seed)
+    np.random.seed(seed)
+    result = minimize_batch_with_stats(target_fn, gradient_fn, theta_0,
+                                       tolerance, batched)
+    
+    if target_value is not None and result.value <= target_value:
+        with first_hit.get_lock():
+            first_hit.value = min(first_hit.value, index)
+    return index, result
+
+
+def minimize_multistart(target_fn, gradient_fn, theta_0s, tolerance=0.000001,
+                        batched=False, seed=0, num_workers=1,
+                        target_value=None, timeout=None):
+    '''runs minimize_batch_with_stats from each of theta_0s, returns a
+    MultistartResult of the best StartRun and all of them
+    stops early once a run gets to target_value or less, and gives up on
+    the runs that haven't finished after timeout seconds. without a
+    timeout, num_workers=1 runs in this process; with one, it runs on a
+    pool of one worker, so a run still going at the deadline is stopped'''
+    from multiprocessing import TimeoutError, Value
+    
+    jobs = [(i, seed + i, theta_0) for i, theta_0 in enumerate(theta_0s)]
+    first_hit = Value('l', len(jobs))
+    state = (target_fn, gradient_fn, tolerance, batched, target_value, first_hit)
+    deadline = None if timeout is None else timeit.default_timer() + timeout
+    finished = {}
+    
+    def all_needed_finished():
+        # every run up to and including the first to reach target_value.
+        # that run sets first_hit before its result gets back here, so it
+        # has to be waited for like the ones before it
+        return all(i in finished
+                   for i in range(min(first_hit.value + 1, len(jobs))))
+    
+    if num_workers > 1 or timeout is not None:
+        pool = shared_pool(num_workers, *state)
+        try:
+            outcomes = pool.imap_unordered(_run_start, jobs)
+            while not all_needed_finished():
+                remaining = (None if deadline is None
+                             else max(0, deadline - timeit.default_timer()))
+                index, result = outcomes.next(remaining)
+                finished[index] = result
+        except (TimeoutError, StopIteration):
+            pass
+        finally:
+            # anything still running is either skipped or out of time
+            pool.terminate()
+            pool.join()
+    else:
+        share(*state)
+        for job in jobs:
+            if all_needed_finished():
+                break
+            index, result = _run_start(job)
+            finished[index] = result
+    
+    runs = []
+    for index, job_seed, theta_0 in jobs:
+        result = finished.get(index)
+        if result is not None:
+            status = 'done'
+        elif index > first_hit.value:
+            status = 'skipped'
+        else:
+            status = 'timeout'
+        runs.append(StartRun(index, job_seed, theta_0, status, result))
+    
+    done = [run for run in runs
+            if run.status == 'done' and run.index <= first_hit.value]
+    best = min(done, key=lambda run: (run.result.value, run.index)) if done else None
+    return MultistartResult(best, runs)
+
+
+def maximize_multistart(target_fn, gradient_fn, theta_0s, tolerance=0.000001,
+                        batched=False, seed=0, num_workers=1,
+                        target_value=None, timeout=None):
+    result = minimize_multistart(negate(target_fn), negate_all(gradient_fn),
+                                 theta_0s, tolerance, batched, seed,
+                                 num_workers,
+                                 None if target_value is None else -target_value,
+                                 timeout)
+    
+    def unnegate(run):
+        if run is None or run.result is None:
+            return run
+        return run._replace(result=run.result._replace(value=-run.result.value))
+    return MultistartResult(unnegate(result.best), [unnegate(run) for run in result.runs])
 
 
 # stochastic gradients - computes the gradient one step at a time
@@ -125,9 +510,10 @@ def in_random_order(data):
         yield data[i]
 
 
-def minimize_stochastic(target_fn, gradient_fn, x, y, theta_0, alpha_0=0.01):
+def minimize_stochastic(target_fn, gradient_fn, x, y, theta_0, alpha_0=0.01,
+                        tracer=None):
     
-    data = zip(x, y)
+    data = list(zip(x, y))
     theta = theta_0
     alpha = alpha_0
     min_theta, min_value = None, float('inf')
@@ -135,26 +521,200 @@ def minimize_stochastic(target_fn, gradient_fn, x, y, theta_0, alpha_0=0.01):
     
     # if we ever go 100 iterations with no improvement, stop
     while iterations_with_no_improvement < 100:
+        if tracer is not None: now = tracer.clock()
+        
         # find the sum (additive)
         value = sum(target_fn(x_i, y_i, theta) for x_i, y_i in data)
         
+        if tracer is not None:
+            now = tracer.time('target', now)
+            tracer.count('target_evaluations', len(data))
+        
         if value < min_value:
             # if a new min is found, save it and go back to the original step size
             min_theta, min_value = theta, value
             iterations_with_no_improvement = 0
             alpha = alpha_0
         else:  # decrease the step size
+            iterations_with_no_improvement += 1
             alpha *= 0.9
         
         # take a gradient step for each data point
-        for x_i, y_i in random_order(data):
+        for x_i, y_i in in_random_order(data):
             gradient_i = gradient_fn(x_i, y_i, theta)
             theta = np.subtract(theta, np.dot(alpha, gradient_i))
+        
+        if tracer is not None:
+            tracer.time('steps', now)
+            tracer.count('gradient_evaluations', len(data))
+            if tracer.iteration(value=value, alpha=alpha,
+                                iterations_with_no_improvement=iterations_with_no_improvement):
+                break
     
     return min_theta
 
 
-def maximize_stochastic(target_fn, gradient_fn, x, y, theta_0, alpha_0=0.01):
+def maximize_stochastic(target_fn, gradient_fn, x, y, theta_0, alpha_0=0.01,
+                        tracer=None):
     return minimize_stochastic(negate(target_fn),
                                negate_all(gradient_fn),
-                               x, y, theta_0, alpha_0)
\ No newline at end of file
+                               x, y, theta_0, alpha_0, tracer)
+
+
+# mini-batch gradients - like minimize_stochastic, but each step uses the
+# gradient of a batch of points, so target_fn and gradient_fn run vectorized
+# over arrays of rows instead of once per point.
+# both take (x_batch, y_batch, theta) and return the sum over the batch
+
+# what a run of minimize_minibatch found, and how fast it got through the data
+MinibatchResult = namedtuple('MinibatchResult',
+                             ['theta', 'value', 'epochs', 'samples',
+                              'seconds', 'samples_per_second'])
+
+
+def minibatches(x, y, batch_size, random_state):
+    '''generator that returns (x_batch, y_batch) pairs in random order,
+    by slicing a permutation of the row indexes'''
+    indexes = random_state.permutation(len(x))
+    for start in range(0, len(indexes), batch_size):
+        batch = indexes[start:start + batch_size]
+        yield x[batch], y[batch]
+
+
+def chunked_minibatches(chunks, batch_size, random_state):
+    '''minibatches of each (x_chunk, y_chunk) in turn, for data that
+    doesn't fit in memory'''
+    for x_chunk, y_chunk in chunks:
+        for batch in minibatches(np.asarray(x_chunk), np.asarray(y_chunk),
+                                 batch_size, random_state):
+            yield batch
+
+
+class SGDStep(object):
+    '''plain step: theta - alpha * gradient'''
+    def __call__(self, theta, gradient, alpha):
+        return theta - alpha * gradient
+
+
+class MomentumStep(object):
+    '''steps along a running (decaying) sum of the gradients'''
+    def __init__(self, momentum=0.9):
+        self.momentum = momentum
+        self.velocity = 0.0
+    
+    def __call__(self, theta, gradient, alpha):
+        self.velocity = self.momentum * self.velocity + gradient
+        return theta - alpha * self.velocity
+
+
+class AdamStep(object):
+    '''scales each coordinate's step by running estimates of the mean and
+    the uncentered variance of its gradient (kingma & ba)'''
+    def __init__(self, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.beta1, self.beta2, self.epsilon = beta1, beta2, epsilon
+        self.mean, self.variance, self.t = 0.0, 0.0, 0
+    
+    def __call__(self, theta, gradient, alpha):
+        self.t += 1
+        self.mean = self.beta1 * self.mean + (1 - self.beta1) * gradient
+        self.variance = (self.beta2 * self.variance +
+                         (1 - self.beta2) * gradient * gradient)
+        mean = self.mean / (1 - self.beta1 ** self.t)
+        variance = self.variance / (1 - self.beta2 ** self.t)
+        return theta - alpha * mean / (np.sqrt(variance) + self.epsilon)
+
+
+def minimize_minibatch(target_fn, gradient_fn, x, y, theta_0, alpha_0=0.01,
+                       batch_size=32, step_rule=None, max_epochs=None,
+                       seed=None, tracer=None):
+    '''mini-batch version of minimize_stochastic, returns a MinibatchResult
+    x and y are arrays of rows, or y is None and x is a function that
+    returns a fresh iterable of (x_chunk, y_chunk) pairs on every call
+    step_rule is SGDStep() by default, or e.g. MomentumStep() / AdamStep()'''
+    random_state = np.random.RandomState(seed)
+    step_rule = step_rule or SGDStep()
+    
+    if y is None:
+        read_chunks = x
+    else:
+        x, y = np.asarray(x), np.asarray(y)
+        read_chunks = lambda: [(x, y)]
+    
+    start = timeit.default_timer()
+    theta = np.array(theta_0, dtype=float)
+    alpha = alpha_0
+    min_theta, min_value = None, float('inf')
+    epochs, samples = 0, 0
+    iterations_with_no_improvement = 0
+    
+    # if we ever go 100 iterations with no improvement, stop
+    while (iterations_with_no_improvement < 100 and
+           (max_epochs is None or epochs < max_epochs)):
+        if tracer is not None: now = tracer.clock()
+        
+        # find the sum (additive), one chunk at a time
+        value = sum(target_fn(x_chunk, y_chunk, theta)
+                    for x_chunk, y_chunk in read_chunks())
+        
+        if tracer is not None:
+            now = tracer.time('target', now)
+            tracer.count('target_evaluations')
+        
+        if value < min_value:
+            # if a new min is found, save it and go back to the original step size
+            min_theta, min_value = theta, value
+            iterations_with_no_improvement = 0
+            alpha = alpha_0
+        else:  # decrease the step size
+            iterations_with_no_improvement += 1
+            alpha *= 0.9
+        
+        # take a gradient step for each batch, using the mean gradient
+        for x_batch, y_batch in chunked_minibatches(read_chunks(), batch_size,
+                                                    random_state):
+            if tracer is not None: now = tracer.clock()
+            gradient = np.asarray(gradient_fn(x_batch, y_batch, theta)) / len(x_batch)
+            if tracer is not None: now = tracer.time('gradient', now)
+            theta = step_rule(theta, gradient, alpha)
+            samples += len(x_batch)
+            if tracer is not None:
+                tracer.time('step', now)
+                tracer.count('gradient_evaluations')
+        epochs += 1
+        
+        if tracer is not None and tracer.iteration(value=value, alpha=alpha,
+                                                   samples=samples):
+            break
+    
+    seconds = timeit.default_timer() - start
+    return MinibatchResult(min_theta, min_value, epochs, samples, seconds,
+                           samples / seconds if seconds > 0 else float('inf'))
+
+
+def maximize_minibatch(target_fn, gradient_fn, x, y, theta_0, alpha_0=0.01,
+                       batch_size=32, step_rule=None, max_epochs=None,
+                       seed=None, tracer=None):
+    result = minimize_minibatch(negate(target_fn), negate(gradient_fn),
+                                x, y, theta_0, alpha_0, batch_size,
+                                step_rule, max_epochs, seed, tracer)
+    return result._replace(value=-result.value)
+
+
+if __name__ == '__main__':
+    v = [random.randint(-10, 10) for i in range(3)]
+
+    tolerance = 0.0000001
+
+    while True:
+        gradient = sum_of_squares_gradient(v)
+        next_v = step(v, gradient, -0.01)
+        if distance(next_v, v) < tolerance:
+            break
+        v = next_v
+
+    print(v)
+    print('-' * 40)
+
+    # the same minimum with minimize_batch, with what it cost
+    pprint(minimize_batch_with_stats(sum_of_squares, sum_of_squares_gradient,
+                                     [random.randint(-10, 10) for i in range(3)]))
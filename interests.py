@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import sys
+import zlib
+import itertools
+import numpy as np
+from collections import Counter
+
+try:
+    intern
+except NameError:
+    intern = sys.intern
+
+
+# inverted index of (user_id, interest) pairs - interests are interned to
+# integer ids, and each interest's users (and each user's interest ids)
+# are kept as sorted arrays, so lookups don't scan the pairs and the
+# index is updated in place as pairs are added or removed
+
+def insert_sorted(array, value):
+    '''returns (array with value inserted in order, True), or
+    (array, False) if value was already in it'''
+    i = np.searchsorted(array, value)
+    if i < len(array) and array[i] == value:
+        return array, False
+    return np.insert(array, i, value), True
+
+
+def remove_sorted(array, value):
+    '''returns (array without value, True), or (array, False) if it wasn't there'''
+    i = np.searchsorted(array, value)
+    if i < len(array) and array[i] == value:
+        return np.delete(array, i), True
+    return array, False
+
+
+class InterestIndex(object):
+
+    def __init__(self, pairs=()):
+        self.interest_ids = {}          # interest -> id
+        self.interest_names = []        # id -> interest
+        self.users_by_interest = []     # id -> sorted array of user ids
+        self.interests_by_user = {}     # user id -> sorted array of interest ids
+
+        self._build(pairs)
+
+    def _build(self, pairs):
+        '''indexes pairs into the empty index all at once: one sort of the
+        (interest id, user id) pairs cuts out every interest's users, and one
+        of the (user id, interest id) pairs every user's interests - rather
+        than an add per pair, each of which copies a whole posting array'''
+        pairs = list(pairs)
+        if not pairs:
+            return
+        user_ids = np.array([user_id for user_id, _ in pairs], dtype=np.int32)
+        interest_ids = np.array([self.intern(interest) for _, interest in pairs],
+                                dtype=np.int32)
+
+        # interest by interest, without repeats
+        order = np.lexsort((user_ids, interest_ids))
+        users, by_interest = user_ids[order], interest_ids[order]
+        new = np.ones(len(order), dtype=bool)
+        new[1:] = (users[1:] != users[:-1]) | (by_interest[1:] != by_interest[:-1])
+        users, by_interest = users[new], by_interest[new]
+
+        bounds = np.searchsorted(by_interest, np.arange(len(self.interest_names) + 1))
+        self.users_by_interest = [users[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+        # and user by user
+        order = np.lexsort((by_interest, users))
+        users, by_interest = users[order], by_interest[order]
+        ids, starts = np.unique(users, return_index=True)
+        ends = np.append(starts[1:], len(users))
+        self.interests_by_user = dict((user_id, by_interest[lo:hi])
+                                      for user_id, lo, hi in zip(ids.tolist(), starts, ends))
+
+    def intern(self, interest):
+        '''the id of interest, giving it a new one if it's new'''
+        interest_id = self.interest_ids.get(interest)
+        if interest_id is None:
+            interest_id = self.interest_ids[interest] = len(self.interest_names)
+            self.interest_names.append(interest)
+            self.users_by_interest.append(np.empty(0, dtype=np.int32))
+        return interest_id
+
+    def add(self, user_id, interest):
+        interest_id = self.intern(interest)
+        self.users_by_interest[interest_id], added = \
+            insert_sorted(self.users_by_interest[interest_id], user_id)
+        if added:
+            user_interests = self.interests_by_user.get(user_id,
+                                                        np.empty(0, dtype=np.int32))
+            self.interests_by_user[user_id], _ = insert_sorted(user_interests,
+                                                               interest_id)
+
+    def remove(self, user_id, interest):
+        interest_id = self.interest_ids.get(interest)
+        if interest_id is None:
+            return
+        self.users_by_interest[interest_id], removed = \
+            remove_sorted(self.users_by_interest[interest_id], user_id)
+        if removed:
+            self.interests_by_user[user_id], _ = \
+                remove_sorted(self.interests_by_user[user_id], interest_id)
+
+    def users_who_like(self, interest):
+        '''sorted array of the ids of the users who like interest'''
+        interest_id = self.interest_ids.get(interest)
+        if interest_id is None:
+            return np.empty(0, dtype=np.int32)
+        return self.users_by_interest[interest_id]
+
+    def interests_of(self, user_id):
+        return [self.interest_names[interest_id]
+                for interest_id in self.interests_by_user.get(user_id, ())]
+
+    def shared_interest_counts(self, user_id):
+        '''returns (other user ids, number of interests shared with user_id)
+        - the sparse dot product of user_id's interests with everyone's'''
+        interest_ids = self.interests_by_user.get(user_id, ())
+        if len(interest_ids) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+
+        others = np.concatenate([self.users_by_interest[interest_id]
+                                 for interest_id in interest_ids])
+        return np.unique(others[others != user_id], return_counts=True)
+
+    def most_similar(self, user_id, k=None):
+        '''[(other user id, shared interests)] most shared first (ties by
+        id), the same order as Counter.most_common for the top k'''
+        others, counts = self.shared_interest_counts(user_id)
+        if k is not None and k < len(others):
+            # only the top k need sorting
+            top = np.argpartition(-counts, k - 1)[:k]
+            cutoff = counts[top].min()
+            ties = np.nonzero(counts >= cutoff)[0]
+            others, counts = others[ties], counts[ties]
+
+        order = np.lexsort((others, -counts))[:k]
+        return list(zip(others[order].tolist(), counts[order].tolist()))
+
+
+# term counting - counts the words of (user_id, text) records like the
+# words_and_counts Counter in friends.py, but streams the records in chunks
+# to a pool of workers and merges their Counters, or with approximate=True
+# keeps memory bounded with a count-min sketch and a top-k candidate list
+
+def tokenize(text):
+    '''lowercased words of text, interned so repeated words share one string'''
+    return [intern(word) for word in text.lower().split()]
+
+
+def read_records(filename):
+    '''generator of (user_id, text) records from "user_id<tab>text" lines'''
+    with open(filename) as f:
+        for line in f:
+            user_id, _, text = line.rstrip('\n').partition('\t')
+            yield int(user_id), text
+
+
+def record_chunks(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def count_chunk(records):
+    return Counter(word
+                   for user_id, text in records
+                   for word in tokenize(text))
+
+
+def to_bytes(token):
+    return token if isinstance(token, bytes) else token.encode('utf-8')
+
+
+class CountMinSketch(object):
+    '''approximate counts in a fixed depth x width table: each token adds
+    to one cell per row, and its estimate is the smallest of its cells
+    (never too low, and too high by at most ~ e * total / width with
+    probability 1 - e ** -depth)
+    sketches with the same width, depth and seed can be merged'''
+
+    prime = 2147483647  # 2 ** 31 - 1
+
+    def __init__(self, width=1 << 16, depth=4, seed=0):
+        random_state = np.random.RandomState(seed)
+        self.a = random_state.randint(1, self.prime, depth).astype(np.int64)
+        self.b = random_state.randint(0, self.prime, depth).astype(np.int64)
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def buckets(self, tokens):
+        '''(depth, len(tokens)) array of each token's cell in each row'''
+        # crc32 rather than hash(), which changes from process to process
+        hashes = np.array([zlib.crc32(to_bytes(token)) & 0xffffffff
+                           for token in tokens], dtype=np.int64) % self.prime
+        width = self.table.shape[1]
+        return (self.a[:, np.newaxis] * hashes + self.b[:, np.newaxis]) % self.prime % width
+
+    def update(self, counter):
+        tokens = list(counter)
+        counts = np.array([counter[token] for token in tokens], dtype=np.int64)
+        for row, cells in enumerate(self.buckets(tokens)):
+            np.add.at(self.table[row], cells, counts)
+
+    def estimate(self, tokens):
+        cells = self.buckets(tokens)
+        return self.table[np.arange(len(cells))[:, np.newaxis], cells].min(axis=0)
+
+    def merge(self, other):
+        self.table += other.table
+        return self
+
+
+class HeavyHitters(object):
+    '''approximate most_common(k): a CountMinSketch of every count plus
+    the (at most 2k) tokens with the biggest estimates seen so far'''
+
+    def __init__(self, k=100, width=1 << 16, depth=4, seed=0):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth, seed)
+        self.candidates = {}
+
+    def update(self, counter):
+        self.sketch.update(counter)
+        tokens = list(set(counter) | set(self.candidates))
+        self.candidates = dict(zip(tokens, self.sketch.estimate(tokens).tolist()))
+        if len(self.candidates) > 2 * self.k:
+            self.candidates = dict(self.most_common(self.k))
+
+    def most_common(self, n=None):
+        ranked = sorted(self.candidates.items(), key=lambda pair: (-pair[1], pair[0]))
+        return ranked[:n] if n is not None else ranked
+
+
+def count_terms(records, num_workers=1, chunk_size=10000,
+                approximate=False, k=100, width=1 << 16, depth=4):
+    '''counts the words in the text of (user_id, text) records
+    returns a Counter, or with approximate=True a HeavyHitters of the
+    k most common words, whose memory doesn't grow with the vocabulary'''
+    total = HeavyHitters(k, width, depth) if approximate else Counter()
+    chunks = record_chunks(records, chunk_size)
+
+    if num_workers > 1:
+        from multiprocessing import Pool
+        pool = Pool(num_workers)
+        try:
+            for counter in pool.imap_unordered(count_chunk, chunks):
+                total.update(counter)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for chunk in chunks:
+            total.update(count_chunk(chunk))
+
+    return total
+
+
+if __name__ == '__main__':
+    from friends import interests
+
+    index = InterestIndex(interests)
+    print('users who like Java: %s' % index.users_who_like('Java'))
+    print('most similar to 0: %s' % index.most_similar(0))
+
+    index.remove(9, 'Java')
+    index.add(9, 'Cassandra')
+    print('most similar to 0 now: %s' % index.most_similar(0, k=2))
+
+    print('word counts: %s' % count_terms(interests).most_common(5))
+    print('approximate: %s' % count_terms(interests, approximate=True, k=5).most_common(5))
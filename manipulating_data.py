@@ -3,8 +3,9 @@
 from __future__ import division
 
 import csv
-import dateutil.parser
 import cleandata
+import csvcache
+import numpy as np
 from pprint import pprint
 from collections import defaultdict
 
@@ -32,6 +33,113 @@ def group_by(grouper, rows, value_transform=None):
                 for key, rows in grouped.iteritems() }
 
 
+# columnar group by - keys are factorized into integer group codes once,
+# then each reduction is a single pass over the value array that
+# accumulates straight into one slot per group
+
+def factorize(keys):
+    '''returns (codes, uniques) where uniques[codes] == keys'''
+    uniques, codes = np.unique(np.asarray(keys), return_inverse=True)
+    return codes, uniques
+
+
+def first_indexes(codes, num_groups):
+    '''index of each group's first row'''
+    indexes = np.full(num_groups, len(codes), dtype=np.intp)
+    np.minimum.at(indexes, codes, np.arange(len(codes)))
+    return indexes
+
+
+def last_indexes(codes, num_groups):
+    '''index of each group's last row'''
+    indexes = np.full(num_groups, -1, dtype=np.intp)
+    np.maximum.at(indexes, codes, np.arange(len(codes)))
+    return indexes
+
+
+def accumulate(ufunc):
+    '''reduction that folds ufunc over each group's values,
+    starting from the group's first value'''
+    def reduce_with(codes, num_groups, values):
+        result = first_of_groups(codes, num_groups, values)
+        ufunc.at(result, codes, values)
+        return result
+    return reduce_with
+
+
+def first_of_groups(codes, num_groups, values):
+    return values[first_indexes(codes, num_groups)]
+
+
+def last_of_groups(codes, num_groups, values):
+    return values[last_indexes(codes, num_groups)]
+
+
+def count_groups(codes, num_groups, values):
+    return np.bincount(codes, minlength=num_groups)
+
+
+def sum_groups(codes, num_groups, values):
+    return np.bincount(codes, weights=values, minlength=num_groups)
+
+
+def mean_groups(codes, num_groups, values):
+    return (sum_groups(codes, num_groups, values) /
+            count_groups(codes, num_groups, values))
+
+
+def overall_change_groups(codes, num_groups, values):
+    '''combines each group's percent changes: product of (1 + x) minus 1'''
+    growth = np.ones(num_groups)
+    np.multiply.at(growth, codes, 1 + np.asarray(values, dtype=float))
+    return growth - 1
+
+
+group_reductions = {
+    'max': accumulate(np.maximum),
+    'min': accumulate(np.minimum),
+    'sum': sum_groups,
+    'mean': mean_groups,
+    'count': count_groups,
+    'first': first_of_groups,
+    'last': last_of_groups,
+    'overall_change': overall_change_groups,
+}
+
+
+def apply_to_groups(codes, num_groups, values, value_transform):
+    '''slow path for arbitrary transforms: splits values into one
+    array per group (in their original order) and calls value_transform on each'''
+    order = np.argsort(codes, kind='mergesort')  # stable
+    boundaries = np.cumsum(np.bincount(codes, minlength=num_groups))[:-1]
+    groups = np.split(values[order], boundaries)
+    results = [value_transform(group) for group in groups]
+    
+    if all(np.isscalar(result) for result in results):
+        return np.array(results)
+    reduced = np.empty(num_groups, dtype=object)
+    for i, result in enumerate(results):
+        reduced[i] = result
+    return reduced
+
+
+def reduce_groups(codes, num_groups, values, reduction):
+    '''reduces values by group code (0 <= code < num_groups)
+    reduction is the name of one of group_reductions or any function
+    of an array of values'''
+    values = np.asarray(values)
+    if reduction in group_reductions:
+        return group_reductions[reduction](codes, num_groups, values)
+    return apply_to_groups(codes, num_groups, values, reduction)
+
+
+def group_by_columns(keys, values, reduction):
+    '''columnar version of group_by
+    returns (group keys, reduced values) as arrays'''
+    codes, uniques = factorize(keys)
+    return uniques, reduce_groups(codes, len(uniques), values, reduction)
+
+
 def percent_price_change(yesterday, today):
     return today['closing_price'] / yesterday['closing_price'] - 1
 
@@ -47,6 +155,56 @@ def day_over_day_changes(grouped_rows):
             for yesterday, today in zip(ordered, ordered[1:])]
 
 
+# vectorized day over day changes for every symbol at once: sort once by
+# (symbol, date), then divide each price by the one before it, masking out
+# the pairs that straddle two symbols
+
+def day_over_day_arrays(symbol_codes, dates, closing_prices):
+    '''returns (symbol codes, dates, changes) arrays'''
+    order = np.lexsort((dates, symbol_codes))  # by symbol, then date
+    symbol_codes = np.asarray(symbol_codes)[order]
+    dates = np.asarray(dates)[order]
+    closing_prices = np.asarray(closing_prices, dtype=float)[order]
+    
+    same_symbol = symbol_codes[1:] == symbol_codes[:-1]
+    changes = closing_prices[1:] / closing_prices[:-1] - 1
+    return (symbol_codes[1:][same_symbol],
+            dates[1:][same_symbol],
+            changes[same_symbol])
+
+
+def day_over_day_table(columns):
+    '''day_over_day_changes for all the symbols in Columns loaded from
+    stocks.csv, as Columns of symbol (codes), date and change'''
+    symbol_codes, dates, changes = day_over_day_arrays(columns['symbol'],
+                                                       columns['date'],
+                                                       columns['closing_price'])
+    names = ['symbol', 'date', 'change']
+    data = dict(zip(names, [symbol_codes, dates, changes]))
+    errors = {'symbol': np.zeros(len(changes), dtype=bool),
+              'date': np.isnat(dates),
+              'change': np.isnan(changes)}
+    categories = {'symbol': columns.categories['symbol']}
+    return cleandata.Columns(names, data, errors, categories)
+
+
+def largest_change(table):
+    '''the row of a day_over_day_table with the biggest change'''
+    return table.row(np.nanargmax(table['change']))
+
+
+def smallest_change(table):
+    return table.row(np.nanargmin(table['change']))
+
+
+def monthly_overall_changes(table):
+    '''compounds the changes in a day_over_day_table by calendar month
+    returns {month number: overall change}'''
+    months = table['date'].astype('datetime64[M]').astype(int) % 12 + 1
+    months, changes = group_by_columns(months, table['change'], 'overall_change')
+    return dict(zip(months.tolist(), changes.tolist()))
+
+
 # to combine percent changes, we add 1 to each, multiply them, and subtract 1
 # for instance, if we combine +10% and -20%, the overall change is
 #    (1 + 10%) * (1 - 20%) - 1 = 1.1 * .8 - 1 = -12%
@@ -61,7 +219,7 @@ def overall_change(changes):
 if __name__ == '__main__':
     data = []
     
-    parser_dict = {'date': dateutil.parser.parse,
+    parser_dict = {'date': cleandata.DateParser(),
                    'closing_price': float}
     
     with open('stocks.csv', 'rb') as f:
@@ -92,6 +250,15 @@ if __name__ == '__main__':
                                    lambda rows: max(pluck('closing_price', rows)))
     
     pprint(max_price_by_symbol)
+    
+    # or on columns, without building the per-symbol lists of rows
+    columns = csvcache.load_columns_cached('stocks.csv', parser_dict,
+                                           delimiter="\t")
+    
+    symbols, max_prices = group_by_columns(columns.labels('symbol'),
+                                           columns['closing_price'],
+                                           'max')
+    pprint(dict(zip(symbols, max_prices)))
 
     # find the largest and smallest one-day percent change
     # key is symbol, value is list of "change" dicts
@@ -120,3 +287,14 @@ if __name__ == '__main__':
                                        all_changes,
                                        overall_change)
     print('overall_change_by_month: %s' %overall_change_by_month)
+    
+    # and all of it again, vectorized over the columns
+    changes = day_over_day_table(columns)
+    
+    print('max:')
+    pprint(largest_change(changes))
+    
+    print('min:')
+    pprint(smallest_change(changes))
+    
+    print('overall_change_by_month: %s' % monthly_overall_changes(changes))
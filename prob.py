@@ -4,20 +4,25 @@ from __future__ import division
 import numpy as np
 from matplotlib import pyplot as plt
 from scipy.stats import norm
+import fastnorm
 
 plot_pdf = True
 plot_cdf = True
 plot_ppf = True  # inverse cdf - percent point function
+use_fastnorm = False  # table lookups instead of scipy (see fastnorm)
+
+if use_fastnorm:
+    norm = fastnorm
 
 # x = std dev
 # y = prob
 # sigma = 1 -> ~ 68% prob of a random var falling w/i this range
 if plot_pdf:
-    xs = [x / 10.0 for x in range(-50, 50)]
-    plt.plot(xs, [norm.pdf(x, scale=1) for x in xs], '-', label='mu=0,sigma=1')
-    plt.plot(xs, [norm.pdf(x, scale=2) for x in xs], '--', label='mu=0,sigma=2')
-    plt.plot(xs, [norm.pdf(x, scale=0.5) for x in xs], ':', label='mu=0,sigma=0.5')
-    plt.plot(xs, [norm.pdf(x, loc=-1) for x in xs], '-.', label='mu=-1,sigma=1')
+    xs = np.array([x / 10.0 for x in range(-50, 50)])
+    plt.plot(xs, norm.pdf(xs, scale=1), '-', label='mu=0,sigma=1')
+    plt.plot(xs, norm.pdf(xs, scale=2), '--', label='mu=0,sigma=2')
+    plt.plot(xs, norm.pdf(xs, scale=0.5), ':', label='mu=0,sigma=0.5')
+    plt.plot(xs, norm.pdf(xs, loc=-1), '-.', label='mu=-1,sigma=1')
 
     plt.legend()
     plt.title('Various Normal pdfs')
@@ -25,22 +30,22 @@ if plot_pdf:
 
 # prob of a random var <= a reference pt
 if plot_cdf:
-    xs = [x / 10.0 for x in range(-50, 50)]
-    plt.plot(xs, [norm.cdf(x, scale=1) for x in xs], '-', label='mu=0,sigma=1')
-    plt.plot(xs, [norm.cdf(x, scale=2) for x in xs], '--', label='mu=0,sigma=2')
-    plt.plot(xs, [norm.cdf(x, scale=0.5) for x in xs], ':', label='mu=0,sigma=0.5')
-    plt.plot(xs, [norm.cdf(x, loc=-1) for x in xs], '-.', label='mu=-1,sigma=1')
+    xs = np.array([x / 10.0 for x in range(-50, 50)])
+    plt.plot(xs, norm.cdf(xs, scale=1), '-', label='mu=0,sigma=1')
+    plt.plot(xs, norm.cdf(xs, scale=2), '--', label='mu=0,sigma=2')
+    plt.plot(xs, norm.cdf(xs, scale=0.5), ':', label='mu=0,sigma=0.5')
+    plt.plot(xs, norm.cdf(xs, loc=-1), '-.', label='mu=-1,sigma=1')
 
     plt.legend(loc=4)  # bottom right
     plt.title('Various Normal cdfs')
     plt.show()
 
 if plot_ppf:
-    xs = [x / 10.0 for x in range(-50, 50)]
-    plt.plot(xs, [norm.ppf(x, scale=1) for x in xs], '-', label='mu=0,sigma=1')
-    plt.plot(xs, [norm.ppf(x, scale=2) for x in xs], '--', label='mu=0,sigma=2')
-    plt.plot(xs, [norm.ppf(x, scale=0.5) for x in xs], ':', label='mu=0,sigma=0.5')
-    plt.plot(xs, [norm.ppf(x, loc=-1) for x in xs], '-.', label='mu=-1,sigma=1')
+    xs = np.array([x / 10.0 for x in range(-50, 50)])
+    plt.plot(xs, norm.ppf(xs, scale=1), '-', label='mu=0,sigma=1')
+    plt.plot(xs, norm.ppf(xs, scale=2), '--', label='mu=0,sigma=2')
+    plt.plot(xs, norm.ppf(xs, scale=0.5), ':', label='mu=0,sigma=0.5')
+    plt.plot(xs, norm.ppf(xs, loc=-1), '-.', label='mu=-1,sigma=1')
 
     plt.legend(loc=4)  # bottom right
     plt.title('Various Normal ppfs')
@@ -10,16 +10,98 @@ from bokeh.models import HoverTool
 
 def scale(data_matrix):
     '''returns the means and standard deviations of each column'''
-    num_rows, num_cols = data_matrix.shape
-    means = [data_matrix[:,j].mean() for j in range(num_cols)]
-    stdevs = [data_matrix[:,j].std() for j in range(num_cols)]
-    return means, stdevs
+    data = np.asarray(data_matrix)
+    return data.mean(axis=0), data.std(axis=0)
+
+
+def rescale_columns(data_matrix, shift, divisor=None, out=None):
+    '''computes (data_matrix - shift) / divisor for every column at once
+    by broadcasting the per-column shift and divisor over the rows
+    writes into out if given (out may be data_matrix itself)'''
+    result = np.subtract(data_matrix, shift, out=out)
+    if divisor is not None:
+        np.divide(result, divisor, out=result)
+    return result
+
 
+def rescale_factors(means, stdevs):
+    '''returns the (shift, divisor) that rescale applies to each column
+    columns with no deviation get shifted by 0 and divided by 1'''
+    has_deviation = stdevs > 0
+    return (np.where(has_deviation, means, 0.0),
+            np.where(has_deviation, stdevs, 1.0))
 
-def rescale(data_matrix):
+
+def rescale(data_matrix, out=None):
     '''rescales the input data so that each column
     has mean 0 and standard deviation 1
-    leaves alone columns with no deviation'''
+    leaves alone columns with no deviation
+    pass out=data_matrix to rescale a float matrix in place'''
+    shift, divisor = rescale_factors(*scale(data_matrix))
+    return rescale_columns(data_matrix, shift, divisor, out)
+
+
+def de_mean_matrix(A, out=None):
+    """returns the result of subtracting from every value in A the mean
+    value of its column. the resulting matrix has mean 0 in every column"""
+    
+    column_means = np.asarray(A).mean(axis=0)
+    return rescale_columns(A, column_means, out=out)
+
+
+def chunks(data_matrix, chunk_size=100000):
+    '''generator that returns data_matrix chunk_size rows at a time
+    (works with memory mapped arrays, so only one chunk is ever loaded)'''
+    for start in range(0, data_matrix.shape[0], chunk_size):
+        yield data_matrix[start:start + chunk_size]
+
+
+class StreamingScaler(object):
+    '''out of core version of scale / rescale
+    keeps running per column utils.Moments, so memory only grows with
+    the number of columns'''
+
+    def __init__(self):
+        self.moments = utils.Moments()
+
+    def partial_fit(self, chunk):
+        '''update the column stats with a chunk of rows'''
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.ndim == 1:
+            chunk = chunk.reshape(1, -1)  # a single row
+
+        self.moments.merge(utils.Moments.of(chunk))
+        return self
+
+    def fit(self, chunks):
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def merge(self, other):
+        '''fold in the stats of a scaler fit on other rows (e.g. by a worker)'''
+        self.moments.merge(other.moments)
+        return self
+
+    def scale(self):
+        '''returns the means and standard deviations of each column,
+        same as scale(data_matrix) on all of the rows seen so far'''
+        return self.moments.mean, np.sqrt(self.moments.variance(ddof=0))
+
+    def transform_chunk(self, chunk, out=None):
+        '''rescale one chunk the same way rescale would the whole matrix'''
+        shift, divisor = rescale_factors(*self.scale())
+        return rescale_columns(chunk, shift, divisor, out)
+
+    def transform(self, chunks):
+        '''generator that lazily rescales each chunk'''
+        for chunk in chunks:
+            yield self.transform_chunk(chunk)
+
+
+# the original cell by cell versions, one python call per (i, j)
+# kept around to check and benchmark the vectorized ones against
+def rescale_cellwise(data_matrix):
     means, stdevs = scale(data_matrix)
     
     def rescaled(i, j):
@@ -32,10 +114,7 @@ def rescale(data_matrix):
     return utils.make_matrix(num_rows, num_cols, rescaled)
 
 
-def de_mean_matrix(A):
-    """returns the result of subtracting from every value in A the mean
-    value of its column. the resulting matrix has mean 0 in every column"""
-    
+def de_mean_matrix_cellwise(A):
     nr, nc = A.shape
     
     column_means, _ = scale(A)
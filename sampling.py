@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import numpy as np
+
+
+# seeded random draws a whole array at a time
+# every Sampler is one stream of numbers, picked by (seed, stream): the same
+# pair always gives the same draws, and different streams of one seed are
+# independent, so giving each worker its own stream keeps a parallel
+# simulation's results the same however the work is spread over processes.
+# seed=None gives an unseeded sampler, different every time
+
+class Sampler(object):
+
+    def __init__(self, seed=0, stream=0):
+        self.seed = seed
+        self.stream = stream
+        self.random_state = np.random.RandomState(
+            None if seed is None else [seed, stream])
+
+    def spawn(self, stream):
+        '''a sampler for another stream of the same seed'''
+        return Sampler(self.seed, stream)
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return self.random_state.uniform(low, high, size)
+
+    def normal(self, mu=0.0, sigma=1.0, size=None):
+        return self.random_state.normal(mu, sigma, size)
+
+    def correlated_normal(self, means, covariance, size):
+        '''size rows of draws from the multivariate normal with the given
+        means and covariance matrix: standard normal rows times the
+        transposed cholesky factor of the covariance'''
+        means = np.asarray(means, dtype=float)
+        factor = np.linalg.cholesky(np.asarray(covariance, dtype=float))
+        z = self.random_state.standard_normal((size, len(means)))
+        return means + np.dot(z, factor.T)
+
+    def binomial(self, n, p, size=None):
+        return self.random_state.binomial(n, p, size)
+
+
+def samplers(seed, num_streams):
+    '''one sampler per worker, streams 0 to num_streams - 1'''
+    return [Sampler(seed, stream) for stream in range(num_streams)]
+
+
+if __name__ == '__main__':
+    sampler = Sampler(seed=0)
+    print('uniform: %s' % sampler.uniform(size=3))
+    print('normal: %s' % sampler.normal(size=3))
+
+    covariance = [[1.0, 0.8], [0.8, 1.0]]
+    draws = sampler.correlated_normal([0, 0], covariance, 100000)
+    print('covariance:\n%s' % np.cov(draws.T))
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+
+from __future__ import division
+
+import itertools
+import numpy as np
+from collections import Counter
+from utils import shared, shared_pool
+
+
+# the friendships graph in compressed sparse row (csr) form:
+# user i's friends are indices[indptr[i]:indptr[i + 1]], in sorted order,
+# so the whole graph is two flat integer arrays instead of a dict per user
+# and a list per friend list
+
+def gather_rows(indptr, indices, rows):
+    '''concatenation of the neighbor lists of rows, without a python loop'''
+    rows = np.asarray(rows)
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    # position of each output entry within its row, plus its row's start
+    row_offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return indices[row_offsets + np.arange(lengths.sum())]
+
+
+def edge_chunks(edges, chunk_size=1000000):
+    '''returns a function that iterates over an (m, 2) array of edges
+    (possibly memory mapped) chunk_size edges at a time'''
+    def read_chunks():
+        for start in range(0, len(edges), chunk_size):
+            yield np.asarray(edges[start:start + chunk_size])
+    return read_chunks
+
+
+def edge_file_chunks(filename, chunk_size=1000000):
+    '''returns a function that reads "user_id friend_id" lines from
+    filename, chunk_size lines at a time'''
+    def read_chunks():
+        with open(filename) as f:
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if not lines:
+                    break
+                yield np.array([line.split() for line in lines if line.strip()],
+                               dtype=np.int64).reshape(-1, 2)
+    return read_chunks
+
+
+class FriendGraph(object):
+    '''undirected friendships between users 0 ... num_users - 1'''
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, friendships, num_users=None):
+        edges = np.asarray(friendships, dtype=np.int64).reshape(-1, 2)
+        return cls.from_edge_chunks(edge_chunks(edges), num_users)
+
+    @classmethod
+    def from_edge_chunks(cls, read_chunks, num_users=None,
+                         sort_block_size=1 << 22):
+        '''builds the graph in two passes over read_chunks() (a function
+        returning an iterable of (k, 2) edge arrays), so only one chunk of
+        edges is ever in memory besides the graph itself
+        self loops and repeated friendships are dropped'''
+
+        # first pass: count each user's friends
+        degrees = np.zeros(num_users or 0, dtype=np.int64)
+        for chunk in read_chunks():
+            chunk = np.asarray(chunk).reshape(-1, 2)
+            chunk = chunk[chunk[:, 0] != chunk[:, 1]]
+            if len(chunk) == 0:
+                continue
+            size = max(len(degrees), int(chunk.max()) + 1)
+            degrees = np.concatenate([degrees, np.zeros(size - len(degrees), dtype=np.int64)])
+            degrees += np.bincount(chunk.ravel(), minlength=size)
+
+        num_users = len(degrees)
+        indptr = np.concatenate([[0], np.cumsum(degrees)])
+        indices = np.empty(indptr[-1], dtype=np.int32)
+
+        # second pass: put each friend in the next free slot of its user's row
+        next_free = indptr[:-1].copy()
+        for chunk in read_chunks():
+            chunk = np.asarray(chunk).reshape(-1, 2)
+            chunk = chunk[chunk[:, 0] != chunk[:, 1]]
+            rows = np.concatenate([chunk[:, 0], chunk[:, 1]])
+            cols = np.concatenate([chunk[:, 1], chunk[:, 0]])
+
+            order = np.argsort(rows, kind='mergesort')
+            rows, cols = rows[order], cols[order]
+            users, first, counts = np.unique(rows, return_index=True,
+                                             return_counts=True)
+            rank = np.arange(len(rows)) - np.repeat(first, counts)
+            indices[next_free[rows] + rank] = cols
+            next_free[users] += counts
+
+        return cls(*sort_rows(indptr, indices, num_users, sort_block_size))
+
+    @property
+    def num_users(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_friendships(self):
+        return len(self.indices) // 2
+
+    def degrees(self):
+        '''number of friends of each user'''
+        return np.diff(self.indptr)
+
+    def friends(self, user_id):
+        '''sorted array of user_id's friends (a view, not a copy)'''
+        return self.indices[self.indptr[user_id]:self.indptr[user_id + 1]]
+
+    def are_friends(self, user_ids, other_ids):
+        '''elementwise: is user_ids[k] friends with other_ids[k]?
+        a binary search of each user's sorted friends, all pairs at once'''
+        user_ids = np.asarray(user_ids)
+        other_ids = np.asarray(other_ids)
+        if len(self.indices) == 0:
+            return np.zeros(np.broadcast(user_ids, other_ids).shape, dtype=bool)
+
+        lo = self.indptr[user_ids].copy()
+        hi = self.indptr[user_ids + 1].copy()
+        end = hi.copy()
+        last = len(self.indices) - 1
+
+        while np.any(lo < hi):
+            active = lo < hi
+            mid = (lo + hi) // 2
+            right = active & (self.indices[np.minimum(mid, last)] < other_ids)
+            lo = np.where(right, mid + 1, lo)
+            hi = np.where(active & ~right, mid, hi)
+
+        return (lo < end) & (self.indices[np.minimum(lo, last)] == other_ids)
+
+    def mutual_friend_counts(self, user_id):
+        '''returns (foaf ids, number of mutual friends) for the friends of
+        user_id's friends who are neither user_id nor already friends'''
+        friends = self.friends(user_id)
+        foafs = gather_rows(self.indptr, self.indices, friends)
+        foafs = foafs[foafs != user_id]
+        # friends is sorted, so membership is a searchsorted away
+        positions = np.searchsorted(friends, foafs)
+        is_friend = (positions < len(friends)) & \
+            (friends[np.minimum(positions, max(len(friends) - 1, 0))] == foafs)
+        return np.unique(foafs[~is_friend], return_counts=True)
+
+    def friends_of_friends_ids(self, user_id):
+        '''same Counter as friends.friends_of_friends_ids'''
+        ids, counts = self.mutual_friend_counts(user_id)
+        return Counter(dict(zip(ids.tolist(), counts.tolist())))
+
+
+# bulk recommendations - squaring the adjacency matrix A counts the mutual
+# friends of every pair of users at once ((A * A)[i, j] is the number of
+# paths i - friend - j), so a whole block of users is one sparse product
+
+def adjacency_matrix(graph):
+    '''the graph as a scipy.sparse csr matrix of 0s and 1s'''
+    from scipy.sparse import csr_matrix
+    ones = np.ones(len(graph.indices), dtype=np.int32)
+    return csr_matrix((ones, graph.indices, graph.indptr),
+                      shape=(graph.num_users, graph.num_users))
+
+
+def top_k_by_row(rows, cols, counts, num_rows, k):
+    '''returns (ids, counts) arrays of shape (num_rows, k) holding the
+    k cols with the biggest counts for each row, ties going to the smaller
+    col; rows with fewer than k are padded with id -1 and count 0'''
+    order = np.lexsort((cols, -counts, rows))
+    rows, cols, counts = rows[order], cols[order], counts[order]
+    
+    # position of each entry within its row
+    starts = np.searchsorted(rows, np.arange(num_rows))
+    rank = np.arange(len(rows)) - starts[rows]
+    top = rank < k
+    
+    top_ids = np.full((num_rows, k), -1, dtype=np.int32)
+    top_counts = np.zeros((num_rows, k), dtype=np.int32)
+    top_ids[rows[top], rank[top]] = cols[top]
+    top_counts[rows[top], rank[top]] = counts[top]
+    return top_ids, top_counts
+
+
+def recommend_block(graph, adjacency, lo, hi, k):
+    '''top k friend of friend suggestions for users lo ... hi - 1'''
+    mutual = adjacency[lo:hi].dot(adjacency).tocoo()
+    rows = mutual.row.astype(np.int64)
+    cols = mutual.col.astype(np.int64)
+    users = rows + lo
+    
+    # not the user, and not already a friend
+    keep = (cols != users) & ~graph.are_friends(users, cols)
+    return top_k_by_row(rows[keep], cols[keep], mutual.data[keep], hi - lo, k)
+
+
+# the pool's workers read the graph through utils.shared()
+def _recommend_range(job):
+    lo, hi, k = job
+    graph, adjacency = shared()
+    return (lo,) + recommend_block(graph, adjacency, lo, hi, k)
+
+
+def recommend_all(graph, k=10, block_users=10000, num_workers=1):
+    '''friend of friend suggestions for every user at once
+    returns (ids, counts), (num_users, k) arrays where row i holds the
+    k users with the most mutual friends with user i (who aren't i or
+    i's friends already), in decreasing order of mutual friends
+    the users are split into ranges of block_users, run on num_workers
+    processes when > 1'''
+    adjacency = adjacency_matrix(graph)
+    jobs = [(lo, min(lo + block_users, graph.num_users), k)
+            for lo in range(0, graph.num_users, block_users)]
+    
+    ids = np.full((graph.num_users, k), -1, dtype=np.int32)
+    counts = np.zeros((graph.num_users, k), dtype=np.int32)
+    
+    if num_workers > 1:
+        pool = shared_pool(num_workers, graph, adjacency)
+        try:
+            blocks = pool.imap_unordered(_recommend_range, jobs)
+            for lo, block_ids, block_counts in blocks:
+                ids[lo:lo + len(block_ids)] = block_ids
+                counts[lo:lo + len(block_ids)] = block_counts
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for lo, hi, k in jobs:
+            ids[lo:hi], counts[lo:hi] = recommend_block(graph, adjacency, lo, hi, k)
+    
+    return ids, counts
+
+
+# live statistics - a friendship only ever moves two users' degrees by one,
+# so users can be kept sorted by degree with O(1) work per change:
+# the users with degree d form a contiguous block of order, and a user whose
+# degree goes up (down) is swapped to the front (back) of its block, which
+# then shrinks by one, leaving the user at the edge of the next block
+
+class LiveNetworkStats(object):
+    '''degree counts, a degree leaderboard, and the total and average
+    number of connections, updated as friendships are added and removed'''
+    
+    def __init__(self, num_users=0, friendships=()):
+        self.degrees = []
+        self.order = []           # user ids, by decreasing degree
+        self.position = []        # user id -> index in order
+        self.first = [0]          # first[d] = number of users with degree > d
+        self.friendships = set()
+        
+        for _ in range(num_users):
+            self.add_user()
+        for user_id, other_id in friendships:
+            self.add_friendship(user_id, other_id)
+    
+    def add_user(self):
+        '''adds a user with no friends, returns its id'''
+        user_id = len(self.degrees)
+        self.degrees.append(0)
+        self.position.append(len(self.order))
+        self.order.append(user_id)
+        return user_id
+    
+    def swap(self, user_id, i):
+        '''swap user_id with the user at order[i]'''
+        j = self.position[user_id]
+        other_id = self.order[i]
+        self.order[i], self.order[j] = user_id, other_id
+        self.position[user_id], self.position[other_id] = i, j
+    
+    def increment(self, user_id):
+        d = self.degrees[user_id]
+        self.swap(user_id, self.first[d])
+        self.first[d] += 1
+        self.degrees[user_id] = d + 1
+        if len(self.first) == d + 1:
+            self.first.append(0)
+    
+    def decrement(self, user_id):
+        d = self.degrees[user_id]
+        self.swap(user_id, self.first[d - 1] - 1)
+        self.first[d - 1] -= 1
+        self.degrees[user_id] = d - 1
+    
+    def add_friendship(self, user_id, other_id):
+        '''returns False if they already were friends'''
+        pair = (min(user_id, other_id), max(user_id, other_id))
+        if user_id == other_id or pair in self.friendships:
+            return False
+        while len(self.degrees) <= pair[1]:
+            self.add_user()
+        self.friendships.add(pair)
+        self.increment(user_id)
+        self.increment(other_id)
+        return True
+    
+    def remove_friendship(self, user_id, other_id):
+        '''returns False if they weren't friends'''
+        pair = (min(user_id, other_id), max(user_id, other_id))
+        if pair not in self.friendships:
+            return False
+        self.friendships.remove(pair)
+        self.decrement(user_id)
+        self.decrement(other_id)
+        return True
+    
+    @property
+    def num_users(self):
+        return len(self.degrees)
+    
+    @property
+    def total_connections(self):
+        return 2 * len(self.friendships)
+    
+    @property
+    def avg_connections(self):
+        return self.total_connections / self.num_users if self.num_users else 0
+    
+    def number_of_friends(self, user_id):
+        return self.degrees[user_id]
+    
+    def top(self, n):
+        '''[(user_id, number_of_friends)] for the n best connected users'''
+        return [(user_id, self.degrees[user_id]) for user_id in self.order[:n]]
+
+
+def sort_rows(indptr, indices, num_users, block_size=1 << 22):
+    '''sorts each row of a csr graph and drops repeated entries, a block
+    of about block_size entries at a time (compacting in place)
+    returns the new (indptr, indices)'''
+    degrees = np.zeros(num_users, dtype=np.int64)
+    write = 0
+    row = 0
+
+    while row < num_users:
+        # as many whole rows as fit in the block (at least one)
+        end_row = max(row + 1, np.searchsorted(indptr, indptr[row] + block_size,
+                                               side='right') - 1)
+        end_row = min(end_row, num_users)
+        lo, hi = indptr[row], indptr[end_row]
+
+        block_rows = np.repeat(np.arange(row, end_row), np.diff(indptr[row:end_row + 1]))
+        keys = block_rows * num_users + indices[lo:hi]
+        keys.sort()
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = keys[1:] != keys[:-1]
+        keys = keys[keep]
+
+        indices[write:write + len(keys)] = keys % num_users
+        degrees[row:end_row] = np.bincount(keys // num_users - row,
+                                           minlength=end_row - row)
+        write += len(keys)
+        row = end_row
+
+    return np.concatenate([[0], np.cumsum(degrees)]), indices[:write]
+
+
+if __name__ == '__main__':
+    friendships = [(0, 1), (0, 2), (1, 2), (1, 3), (2, 3), (3, 4),
+                   (4, 5), (5, 6), (5, 7), (6, 8), (7, 8), (8, 9)]
+
+    graph = FriendGraph.from_edges(friendships)
+    print('users: %d, friendships: %d' % (graph.num_users, graph.num_friendships))
+    print('degrees: %s' % graph.degrees())
+    print('friends of 3: %s' % graph.friends(3))
+    print('friends_of_friends_ids 3: %s' % graph.friends_of_friends_ids(3))
+
+    ids, counts = recommend_all(graph, k=2)
+    print('top 2 suggestions (id, mutual friends) for each user:')
+    for user_id in range(graph.num_users):
+        print('%d: %s' % (user_id, list(zip(ids[user_id].tolist(), counts[user_id].tolist()))))
@@ -0,0 +1,52 @@
+import os
+import datetime
+import tempfile
+import unittest
+import dateutil.parser
+import cleandata
+import csvcache
+
+
+def make_parser(date_format):
+    def parse(s):
+        return datetime.datetime.strptime(s, date_format)
+    return parse
+
+
+class CacheKeyTest(unittest.TestCase):
+
+    def setUp(self):
+        f, self.path = tempfile.mkstemp(suffix='.csv')
+        os.write(f, b'date\n01/02/2015\n')
+        os.close(f)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def key(self, parser):
+        return csvcache.cache_key(self.path, {'date': parser}, ',')
+
+    def test_closures_are_not_cached(self):
+        us, european = make_parser('%m/%d/%Y'), make_parser('%d/%m/%Y')
+        self.assertIsNone(self.key(us))
+        self.assertIsNone(self.key(european))
+        self.assertIsNone(self.key(lambda s: s))
+
+    def test_named_functions_are_cached(self):
+        self.assertIsNotNone(self.key(float))
+        self.assertIsNotNone(self.key(dateutil.parser.parse))
+        self.assertNotEqual(self.key(float), self.key(dateutil.parser.parse))
+
+    def test_date_parser_keyed_on_its_given_format(self):
+        self.assertNotEqual(self.key(cleandata.DateParser('%m/%d/%Y')),
+                            self.key(cleandata.DateParser('%d/%m/%Y')))
+
+        parser = cleandata.DateParser()
+        before = self.key(parser)
+        parser('2015-01-02')  # infers '%Y-%m-%d'
+        self.assertEqual(parser.date_format, '%Y-%m-%d')
+        self.assertEqual(self.key(parser), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
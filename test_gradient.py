@@ -0,0 +1,48 @@
+import time
+import unittest
+import gradient
+
+
+# theta[1] never moves (its gradient is 0), so each run ends at the value
+# it started with in theta[1] - only the run started at 0 reaches 1 or less
+def flat_target(theta):
+    return theta[0] ** 2 + theta[1]
+
+def flat_gradient(theta):
+    return [2 * theta[0], 0.0]
+
+WINNER = 3
+theta_0s = [[1.0, 0.0] if i == WINNER else [1.0, 100.0] for i in range(8)]
+
+run_start = gradient._run_start
+
+def slow_winner_run_start(job):
+    '''returns the winning run's result late, after it has set first_hit'''
+    index, result = run_start(job)
+    if index == WINNER:
+        time.sleep(0.5)
+    return index, result
+
+
+class MultistartTest(unittest.TestCase):
+
+    def setUp(self):
+        # the forked workers pick up the patched _run_start
+        gradient._run_start = slow_winner_run_start
+
+    def tearDown(self):
+        gradient._run_start = run_start
+
+    def test_waits_for_the_run_that_hit_the_target(self):
+        for num_workers in [1, 8]:
+            result = gradient.minimize_multistart(flat_target, flat_gradient,
+                                                  theta_0s,
+                                                  num_workers=num_workers,
+                                                  target_value=1)
+            self.assertEqual(result.best.index, WINNER)
+            self.assertEqual(result.runs[WINNER].status, 'done')
+            self.assertTrue(result.best.result.value <= 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
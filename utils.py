@@ -2,6 +2,7 @@
 
 from __future__ import division
 
+import sys
 import math
 import numpy as np
 from pprint import pprint
@@ -36,17 +37,178 @@ def is_diagonal(i, j):
 # the avg of the squared difference from the mean -> shows how spread out the data is
 def de_mean(x):
     '''translate x's mean to 0'''
-    x_bar = x.mean()
-    return [x_i - x_bar for x_i in x]
+    x = np.asarray(x)
+    return x - x.mean()
+
+
+# summaries that variance, covariance and correlation are computed from.
+# the data is folded in one cache sized block at a time, and summaries of
+# separate shards merge exactly (chan et al.), so shards can be reduced
+# on different cores and combined afterwards
+BLOCK_SIZE = 65536
+
+class Moments(object):
+    '''count, mean and m2 (sum of squared deviations from the mean) of x
+    for 2d x these are per column arrays'''
+    
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+    
+    @classmethod
+    def of(cls, x, block_size=BLOCK_SIZE):
+        moments = cls()
+        for start in range(0, len(x), block_size):
+            block = np.asarray(x[start:start + block_size], dtype=float)
+            block_mean = block.mean(axis=0)
+            deviations = block - block_mean
+            moments.merge(cls(len(block), block_mean,
+                              (deviations * deviations).sum(axis=0)))
+        return moments
+    
+    def merge(self, other):
+        '''fold the moments of other data into these'''
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / n)
+        self.m2 = self.m2 + other.m2 + delta * delta * (self.count * other.count / n)
+        self.count = n
+        return self
+    
+    def variance(self, ddof=1):
+        '''sample variance by default, ddof=0 for the whole population'''
+        return self.m2 / (self.count - ddof)
+
+
+class CoMoments(object):
+    '''moments of x and y plus their co-moment
+    (sum of the products of their deviations from their means)'''
+    
+    def __init__(self, x=None, y=None, c=0.0):
+        self.x = x if x is not None else Moments()
+        self.y = y if y is not None else Moments()
+        self.c = c
+    
+    @classmethod
+    def of(cls, x, y, block_size=BLOCK_SIZE):
+        co_moments = cls()
+        for start in range(0, len(x), block_size):
+            x_block = np.asarray(x[start:start + block_size], dtype=float).ravel()
+            y_block = np.asarray(y[start:start + block_size], dtype=float).ravel()
+            x_dev = x_block - x_block.mean()
+            y_dev = y_block - y_block.mean()
+            co_moments.merge(cls(Moments(len(x_block), x_block.mean(), np.dot(x_dev, x_dev)),
+                                 Moments(len(y_block), y_block.mean(), np.dot(y_dev, y_dev)),
+                                 np.dot(x_dev, y_dev)))
+        return co_moments
+    
+    @property
+    def count(self):
+        return self.x.count
+    
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count > 0:
+            n = self.count + other.count
+            self.c += other.c + ((other.x.mean - self.x.mean) *
+                                 (other.y.mean - self.y.mean) *
+                                 (self.count * other.count / n))
+        else:
+            self.c = other.c
+        self.x.merge(other.x)
+        self.y.merge(other.y)
+        return self
+    
+    def covariance(self, ddof=1):
+        return self.c / (self.count - ddof)
+    
+    def correlation(self):
+        if self.x.m2 > 0 and self.y.m2 > 0:
+            return self.c / math.sqrt(self.x.m2 * self.y.m2)
+        else: return 0
+
+
+# process pools whose workers read big (or unpicklable) data, like memory
+# mapped arrays, graphs or lambdas, from a module global. shared_pool
+# starts the workers with the fork start method, so they inherit the data
+# from the parent's memory rather than having it pickled - with spawn or
+# forkserver the pool's initargs are pickled, which copies arrays and
+# fails for lambdas, so where fork isn't available it raises instead.
+# a task reads the data back with shared()
+_shared = ()
+
+def share(*values):
+    '''makes values what shared() returns in this process'''
+    global _shared
+    _shared = values
+
+def shared():
+    return _shared
+
+def fork_context():
+    '''multiprocessing's fork context (multiprocessing itself on python 2,
+    which always forks except on windows)'''
+    import multiprocessing
+    if not hasattr(multiprocessing, 'get_context'):
+        if sys.platform == 'win32':
+            raise RuntimeError('shared_pool needs the fork start method')
+        return multiprocessing
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        raise RuntimeError('shared_pool needs the fork start method, '
+                           'which this platform does not have')
+
+def shared_pool(num_workers, *values):
+    '''a forked Pool of num_workers processes in which shared() returns values'''
+    return fork_context().Pool(num_workers, share, values)
+
+
+def _reduce_shard(bounds):
+    start, stop = bounds
+    shards = [column[start:stop] for column in shared()]
+    if len(shards) == 1:
+        return Moments.of(shards[0])
+    return CoMoments.of(*shards)
+
+def parallel_moments(x, y=None, num_workers=None, num_shards=None):
+    '''reduces x (and y) into Moments (CoMoments) on a pool of processes
+    one shard per worker by default; x and y may be memory mapped'''
+    from multiprocessing import cpu_count
+    
+    num_workers = num_workers or cpu_count()
+    num_shards = num_shards or num_workers
+    edges = np.linspace(0, len(x), num_shards + 1).astype(int)
+    columns = (x,) if y is None else (x, y)
+    
+    pool = shared_pool(num_workers, *columns)
+    try:
+        summaries = pool.map(_reduce_shard, zip(edges[:-1], edges[1:]))
+    finally:
+        pool.close()
+        pool.join()
+    
+    # merge in shard order so the result doesn't depend on scheduling
+    total = summaries[0]
+    for summary in summaries[1:]:
+        total.merge(summary)
+    return total
+
 
 # divide by n for the whole population
 # divide by n-1 for a sample of the population,
 # to account for a 'correction' -> shows it more spread out
 def variance(x):
     '''assumes x has at least 2 elements'''
-    n = len(x)
-    deviations = de_mean(x)
-    return sum_of_squares(deviations) / (n - 1)
+    return Moments.of(x).variance()
 
 # standard deviation, 68% lies within +- std of the mean
 def standard_deviation(x):
@@ -60,20 +222,11 @@ def interquartile_range(x):
 # a larger covariance indicates better correlation (neg * neg, and pos * pos)
 # ~ how much each entry pair contributed?
 def covariance(x, y):
-    n = len(x)
-    return np.dot(de_mean(x), de_mean(y)) / (n - 1)
+    return CoMoments.of(x, y).covariance()
 
 # correlation, ranges from -1 (anti_correlation) to 1 (perfect correlation)
 def correlation(x,y):
-    #std_x = x.std()
-    #std_y = y.std()
-    cov = np.cov(x, y)
-    std_x = math.sqrt(cov[0, 0])
-    std_y = math.sqrt(cov[1, 1])
-    if std_x > 0 and std_y > 0:
-        #return np.cov(x, y)[0, 1] / std_x / std_y
-        return cov[0, 1] / std_x/ std_y
-    else: return 0
+    return CoMoments.of(x, y).correlation()
 
 
 if __name__ == '__main__':